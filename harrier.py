@@ -64,12 +64,16 @@ class Harrier(object):
         print 'Survey:\t\t{}'.format(settings.survey)
 
         self._gps = None
-        self._database = Database(settings.db, queue)
+        # Pending GPS retry
+        self._gpsTimer = None
+        self._database = Database(settings.db, queue, settings.dbFlush)
         self._receive = Receive(settings, queue)
         self._status = Status(self._database)
         self._server = Server(queue, self._status, self._database, settings)
 
         self._isScanning = False
+        # Pending delayed scan start
+        self._scanTimer = None
         self._cancel = False
         self._signal = signal.signal(signal.SIGINT, self.__close)
 
@@ -77,10 +81,25 @@ class Harrier(object):
         print 'Scan range:\t{:.2f}-{:.2f}MHz'.format(settings.freq - halfBand,
                                                      settings.freq + halfBand)
 
-        if settings.delay is None:
+        if settings.continuous:
+            mode = 'Continuous, {} buffers'.format(settings.recvBuffers)
+        elif settings.delay is None:
             mode = 'Remote'
         else:
             mode = 'Automatic, after {}s'.format(settings.delay)
+        mode += ', {:g}s captures'.format(settings.sampleTime)
+        if settings.watch:
+            mode += ', watching {} collars'.format(len(settings.watchlist))
+        if settings.streaming:
+            mode += ', streaming'
+        if settings.scanZoom:
+            mode += ', zoomed'
+        if settings.detectChannelize:
+            mode += ', channelized'
+        if settings.detectMatch:
+            mode += ', matched'
+        if settings.memory is not None:
+            mode += ', {}MB ceiling'.format(settings.memory)
         print 'Scan mode:\t{}'.format(mode)
 
         events.Post(queue).gps_open(0)
@@ -88,13 +107,9 @@ class Harrier(object):
             events.Post(queue).scan_start()
 
         while not self._cancel:
-            if not queue.empty():
-                self.__process_queue(settings, queue)
-            else:
-                try:
-                    time.sleep(0.1)
-                except IOError:
-                    pass
+            event = events.get_event(queue)
+            if event is not None:
+                self.__process_event(settings, queue, event)
 
         print '\nExiting...'
         waiting = self._status.get_wait()
@@ -102,6 +117,7 @@ class Harrier(object):
             print '(Waiting for {} to finish)'.format(self._status.get_wait())
 
         self._cancel = True
+        events.get_scheduler().cancel_all(queue)
         if self._server is not None:
             self._server.stop()
         if self._gps is not None:
@@ -144,11 +160,10 @@ class Harrier(object):
 
         return args
 
-    def __process_queue(self, settings, queue):
+    def __process_event(self, settings, queue, event):
         if self._cancel:
             return
 
-        event = queue.get()
         eventType = event.get_type()
 
         # Start scan
@@ -156,7 +171,7 @@ class Harrier(object):
             location = self._status.get_location()
             if location is None or time.time() - location[1] > GPS_AGE:
                 self._status.set_status(events.STATUS_WAIT)
-                events.Post(queue).scan_start(1)
+                self.__scan_later(queue, 1)
             elif not self._isScanning:
                 self._receive.receive()
 
@@ -167,32 +182,63 @@ class Harrier(object):
             self._isScanning = False
             timeStamp = event.get_arg('time')
             collars = event.get_arg('collars')
-            if collars is not None:
+            location = self._status.get_location()
+            # Continuous captures are only checked for a fix at the start
+            fixed = location is not None and \
+                time.time() - location[1] <= GPS_AGE
+            if collars is not None and fixed:
                 self._status.set_signals(len(collars))
                 for collar in collars:
-                    location = self._status.get_location()[0]
-                    collar.lon = location[0]
-                    collar.lat = location[1]
+                    collar.lon = location[0][0]
+                    collar.lat = location[0][1]
                     self._database.append_signal(timeStamp,
                                                  collar,
                                                  settings.freq,
                                                  self._settings.survey)
+                self._server.send_signals(timeStamp, collars)
             else:
                 self._status.set_signals(0)
 
-            self._server.send_signals(timeStamp, collars)
-
             log = 'Found {} signals'.format(len(collars))
+            if collars and not fixed:
+                log += ' (not stored, no GPS fix)'
+            if settings.scanPfa is not None or \
+                    settings.scanCandidates is not None:
+                peaks, candidates = self._receive.get_scan_stats()
+                log += ' ({} peaks, {} candidates)'.format(peaks, candidates)
+            searched, level, edges, _found = self._receive.get_detect_stats()
+            stages = ' ({} searched, {} passed level, {} passed edges)'
+            log += stages.format(searched, level, edges)
+            if settings.continuous:
+                _captured, dropped, duty = self._receive.get_stats()
+                log += ' ({} dropped, {:.1f}% duty)'.format(dropped, duty)
+            if settings.detectTrack:
+                known, hits, skipped, saved = self._receive.get_tracker_stats()
+                track = ' (tracked {}/{} found, {} skipped, {:.0f}ms saved)'
+                log += track.format(hits, known, skipped, saved * 1e3)
+            allocs, size = self._receive.get_workspace_stats()
+            if allocs:
+                log += ' ({} allocations, {:.1f}MB)'.format(allocs,
+                                                            size / 1024. ** 2)
+            peaks = self._receive.get_peaks()
+            if peaks:
+                peaks = ['{} {:.0f}MB'.format(name, peak)
+                         for name, peak in peaks.iteritems()]
+                log += ' (peak RSS {})'.format(', '.join(peaks))
             logTime = self._database.append_log(log)
+            self._database.flush()
             self._server.send_log(logTime, log)
 
-            if settings.delay is not None:
-                events.Post(queue).scan_start(settings.delay)
+            if settings.delay is not None and not settings.continuous:
+                self.__scan_later(queue, settings.delay)
 
             self._server.send_status()
 
         # Open GPS
         elif eventType == events.GPS_OPEN:
+            if self._gpsTimer is not None:
+                self._gpsTimer.cancel()
+                self._gpsTimer = None
             if self._gps is not None:
                 self._gps.stop()
                 self._gps.join()
@@ -223,7 +269,7 @@ class Harrier(object):
             self._status.clear_gps()
             self._server.send_status()
 
-            events.Post(queue).gps_open(GPS_RETRY)
+            self._gpsTimer = events.Post(queue).gps_open(GPS_RETRY)
 
         # Info
         elif eventType == events.INFO:
@@ -253,6 +299,12 @@ class Harrier(object):
             self._status.set_status(eventType)
             self._server.send_status()
 
+    # Start a scan after delay (s), moving any pending start
+    def __scan_later(self, queue, delay):
+        timer = self._scanTimer
+        if timer is None or not timer.reschedule(delay):
+            self._scanTimer = events.Post(queue).scan_start(delay)
+
     def __close(self, _signal=None, _frame=None):
         signal.signal(signal.SIGINT, self._signal)
         self._cancel = True
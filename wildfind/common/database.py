@@ -26,7 +26,7 @@ import sqlite3
 from wildfind.common.constants import LOG_SIZE
 
 
-VERSION = 3
+VERSION = 4
 
 
 def __create_table_info(cursor):
@@ -74,21 +74,22 @@ def __create_table_log(cursor):
     cursor.execute(cmd)
 
 
+# Log pruning trigger, removes entries more than LOG_SIZE before the new one
+# using a range of the primary key rather than counting the table
+def __create_trigger_log(cursor):
+    cmd = ('create trigger if not exists LogPrune after insert on Log '
+           'begin'
+           '    delete from Log where Id <= new.Id - {};'
+           'end;').format(LOG_SIZE)
+    cursor.execute(cmd)
+
+
 def __create_tables(cursor):
     __create_table_info(cursor)
     __create_table_scans(cursor)
     __create_table_signals(cursor)
     __create_table_log(cursor)
-
-    # Log pruning trigger
-    cmd = ('create trigger if not exists LogPrune insert on Log when '
-           '(select count(*) from log) > {} '
-           'begin'
-           '    delete from Log where Log.Id not in '
-           '      (select Log.Id from Log order by'
-           '          Id desc limit {});'
-           'end;').format(LOG_SIZE, LOG_SIZE - 1)
-    cursor.execute(cmd)
+    __create_trigger_log(cursor)
 
 
 def __upgrade(cursor):
@@ -106,9 +107,14 @@ def __upgrade(cursor):
     if version == 1:
         __upgrade_1_to_2(cursor)
         __upgrade_2_to_3(cursor)
+        __upgrade_3_to_4(cursor)
 
     if version == 2:
         __upgrade_2_to_3(cursor)
+        __upgrade_3_to_4(cursor)
+
+    if version == 3:
+        __upgrade_3_to_4(cursor)
 
 
 def __upgrade_1_to_2(cursor):
@@ -135,6 +141,18 @@ def __upgrade_2_to_3(cursor):
     cursor.execute(cmd, (3,))
 
 
+def __upgrade_3_to_4(cursor):
+    cmd = 'drop trigger if exists LogPrune'
+    cursor.execute(cmd)
+    __create_trigger_log(cursor)
+
+    cmd = 'delete from Log where Id <= (select max(Id) from Log) - ?'
+    cursor.execute(cmd, (LOG_SIZE,))
+
+    cmd = 'update Info set Value = ? where Key = "DbVersion"'
+    cursor.execute(cmd, (4,))
+
+
 def create_database(connection):
     err = None
 
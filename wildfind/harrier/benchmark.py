@@ -0,0 +1,420 @@
+#!/usr/bin/env python
+#
+#
+# Wild Find
+#
+#
+# Copyright 2014 - 2017 Al Brown
+#
+# Wildlife tracking and mapping
+#
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import Queue
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import timeit
+
+import numpy
+
+from wildfind.common.database import create_database, name_factory
+from wildfind.harrier.collar import Collar
+from wildfind.harrier import events
+from wildfind.harrier.database import Database
+from wildfind.harrier.detect import find_ghosts_matrix, \
+    find_ghosts_pairwise, stream_to_complex
+from wildfind.harrier.psd import psd, Psd, Zoom, ZOOM_AVERAGES, \
+    ZOOM_BINS, ZOOM_DECIMATION
+from wildfind.harrier.scan import find_peaks, Scan, SCAN_BINS, SCAN_CHANGE
+from wildfind.harrier.utils import ArgparseFormatter, Utils
+
+
+# Original loop based peak detector, used as a reference
+# Based on https://gist.github.com/endolith/250860
+def peak_detect_loop(spectrum, delta=SCAN_CHANGE):
+    freqIndices = []
+
+    dtype = spectrum.dtype.type
+    indexPeak = 0
+    levelMin = dtype(numpy.Inf)
+    levelMax = dtype(-numpy.Inf)
+    delta = dtype(delta)
+
+    findPeak = True
+    for i in range(spectrum.size):
+        level = spectrum[i]
+
+        if level > levelMax:
+            levelMax = level
+            indexPeak = i
+        if level < levelMin:
+            levelMin = level
+
+        if findPeak:
+            if level <= levelMax - delta:
+                freqIndices.append(indexPeak)
+                levelMin = level
+                findPeak = False
+        else:
+            if level >= levelMin + delta:
+                levelMax = level
+                indexPeak = i
+                findPeak = True
+
+    return freqIndices
+
+
+# Spectra from slices of a capture or random noise and tones
+def spectra_peaks(count, capture=None):
+    spectra = numpy.empty((count, SCAN_BINS), dtype=numpy.float32)
+
+    if capture is not None:
+        iq = stream_to_complex(numpy.fromfile(capture, dtype=numpy.uint8))
+        size = iq.size / count
+        if size < SCAN_BINS:
+            Utils.error('Capture too short')
+        for i in range(count):
+            _f, levels = psd(iq[i * size:(i + 1) * size], SCAN_BINS, 2.4e6)
+            spectra[i] = 10 * numpy.log10(levels)
+    else:
+        for i in range(count):
+            scale = numpy.random.uniform(0.1, 3)
+            spectra[i] = numpy.random.normal(0, scale, SCAN_BINS)
+            tones = numpy.random.randint(0, SCAN_BINS, 20)
+            spectra[i, tones] += numpy.random.uniform(2, 30, tones.size)
+            # Plateaus
+            spectra[i, 100:110] = spectra[i, 100]
+        spectra[0, 10:20] = -numpy.inf
+
+    return spectra
+
+
+def bench_peaks(args):
+    spectra = spectra_peaks(args.count, args.capture)
+
+    print 'Peak detection ({} spectra)'.format(args.count)
+
+    peaks = find_peaks(spectra)
+    for i, spectrum in enumerate(spectra):
+        if list(peaks[i]) != peak_detect_loop(spectrum):
+            Utils.error('Peaks of spectrum {} do not match'.format(i))
+        if list(find_peaks(spectrum)[0]) != list(peaks[i]):
+            Utils.error('Peaks of spectrum {} differ alone'.format(i))
+    print '\tParity:\t\tOK'
+    print '\tPeaks:\t\t{:.0f} per spectrum'.format(numpy.mean(map(len,
+                                                                 peaks)))
+
+    timeLoop = timeit.timeit(lambda: [peak_detect_loop(spectrum)
+                                      for spectrum in spectra],
+                             number=args.runs)
+    timeSingle = timeit.timeit(lambda: [find_peaks(spectrum)
+                                        for spectrum in spectra],
+                               number=args.runs)
+    timeBatch = timeit.timeit(lambda: find_peaks(spectra), number=args.runs)
+
+    count = float(args.runs * args.count)
+    print '\tLoop:\t\t{:.3f}ms'.format(timeLoop * 1e3 / count)
+    print '\tSingle:\t\t{:.3f}ms'.format(timeSingle * 1e3 / count)
+    print '\tBatch:\t\t{:.3f}ms'.format(timeBatch * 1e3 / count)
+
+
+# Demodulated signals with ghosts of stronger collars at similar rates
+def signals_ghosts(count, chunks):
+    signals = numpy.abs(numpy.random.normal(0, 1, (chunks, count)))
+    pulses = numpy.random.uniform(0, 1, (chunks, count)) > 0.95
+    signals += pulses * numpy.random.uniform(5, 20, count)
+
+    detected = []
+    for signalNum in range(count):
+        # Every third signal is a ghost of the previous one
+        if signalNum % 3 == 2:
+            scale = numpy.random.uniform(0.2, 1)
+            signals[:, signalNum] = signals[:, signalNum - 1] * scale
+            signals[:, signalNum] += numpy.random.normal(0, 1, chunks)
+            rate = detected[-1].rate + numpy.random.uniform(-2, 2)
+        else:
+            rate = numpy.random.uniform(20, 120)
+        level = numpy.random.uniform(0.01, 0.5)
+        collar = Collar(20, rate, level, 20)
+        collar.signalNum = signalNum
+        detected.append(collar)
+
+    return signals.astype(numpy.float16).T, detected
+
+
+def bench_ghosts(args):
+    print 'Ghost removal ({} chunks)'.format(args.chunks)
+
+    for count in args.counts:
+        signals, detected = signals_ghosts(count, args.chunks)
+
+        ghosts = find_ghosts_matrix(signals, detected)
+        if ghosts != find_ghosts_pairwise(signals, detected):
+            Utils.error('Ghosts of {} detections do not match'.format(count))
+
+        timeLoop = timeit.timeit(lambda: find_ghosts_pairwise(signals,
+                                                              detected),
+                                 number=args.runs)
+        timeMatrix = timeit.timeit(lambda: find_ghosts_matrix(signals,
+                                                              detected),
+                                   number=args.runs)
+
+        print '\t{} detections, {} ghosts'.format(count, len(ghosts))
+        print '\t\tPairwise:\t{:.3f}ms'.format(timeLoop * 1e3 / args.runs)
+        print '\t\tMatrix:\t\t{:.3f}ms'.format(timeMatrix * 1e3 / args.runs)
+
+
+# Samples from a capture or noise and tones, with the tone frequencies
+def samples_zoom(count, capture=None):
+    fs = 2.4e6
+    if capture is not None:
+        iq = stream_to_complex(numpy.fromfile(capture, dtype=numpy.uint8))
+        return iq, None
+
+    size = int(fs * 4)
+    iq = numpy.random.normal(0, 1, size) + 1j * numpy.random.normal(0, 1, size)
+    iq = iq.astype(numpy.complex64)
+    tones = numpy.sort(numpy.random.uniform(-fs * 0.45, fs * 0.45, count))
+    times = numpy.arange(size) / fs
+    for tone in tones:
+        iq += 0.05 * numpy.exp(2j * numpy.pi * tone * times)
+
+    return iq, tones
+
+
+def bench_zoom(args):
+    fs = 2.4e6
+    iq, tones = samples_zoom(args.count, args.capture)
+    nfft = ZOOM_BINS * ZOOM_DECIMATION
+
+    def coarse():
+        scan = Scan(fs, iq, zoom=Zoom(fs))
+        return scan.search(), scan.refine(iq)
+
+    def fine():
+        _f, levels = Psd(nfft, fs, averages=ZOOM_AVERAGES).compute(iq)
+        return find_peaks(10 * numpy.log10(levels))[0]
+
+    print 'Zoomed scan ({} bin resolution)'.format(nfft)
+
+    found, refined = coarse()
+    print '\tSignals:\t{}'.format(len(found))
+    if tones is not None:
+        errorsFound = [numpy.min(numpy.abs(found - tone)) for tone in tones]
+        errorsRefined = [numpy.min(numpy.abs(refined - tone))
+                         for tone in tones]
+        print '\tMedian error:\t{:.1f}Hz'.format(numpy.median(errorsFound))
+        print '\tZoomed:\t\t{:.1f}Hz'.format(numpy.median(errorsRefined))
+
+    timeCoarse = timeit.timeit(coarse, number=args.runs)
+    timeFine = timeit.timeit(fine, number=args.runs)
+
+    print '\tSearch & zoom:\t{:.3f}ms'.format(timeCoarse * 1e3 / args.runs)
+    print '\tFull spectrum:\t{:.3f}ms'.format(timeFine * 1e3 / args.runs)
+
+
+# Original writer, a transaction for each signal, used as a reference
+def add_signal_loop(conn, timeStamp, signal, frequency, survey):
+    with conn:
+        cmd = 'insert into Scans values(?, ?, ?)'
+        try:
+            conn.execute(cmd, (timeStamp, frequency, survey))
+        except sqlite3.IntegrityError:
+            pass
+
+        cmd = 'insert into Signals values (null, ?, ?, ?, ?, ?, ?, ?)'
+        conn.execute(cmd, (timeStamp,
+                           signal.freq,
+                           signal.mod,
+                           signal.rate,
+                           signal.level,
+                           signal.lon,
+                           signal.lat))
+
+
+# Scans of collars, with their time stamps
+def signals_database(count, perScan):
+    scans = []
+    timeStamp = int(time.time())
+    for i in range(0, count, perScan):
+        collars = []
+        for _j in range(min(perScan, count - i)):
+            collar = Collar(20, numpy.random.uniform(20, 120),
+                            numpy.random.uniform(0.01, 0.5), 20)
+            collar.freq = numpy.random.uniform(150e6, 152e6)
+            collar.mod = 0
+            collar.lon = numpy.random.uniform(-180, 180)
+            collar.lat = numpy.random.uniform(-90, 90)
+            collars.append(collar)
+        scans.append((timeStamp + i, collars))
+
+    return scans
+
+
+def bench_database(args):
+    scans = signals_database(args.count, args.signals)
+    folder = tempfile.mkdtemp()
+
+    def loop():
+        path = os.path.join(folder, 'loop.wfh')
+        conn = sqlite3.connect(path)
+        conn.row_factory = name_factory
+        create_database(conn)
+        for timeStamp, collars in scans:
+            for collar in collars:
+                add_signal_loop(conn, timeStamp, collar, 150e6, 'Benchmark')
+        conn.close()
+        os.remove(path)
+
+    def batched():
+        path = os.path.join(folder, 'batched.wfh')
+        database = Database(path, Queue.Queue(), args.flush)
+        for timeStamp, collars in scans:
+            for collar in collars:
+                database.append_signal(timeStamp, collar, 150e6, 'Benchmark')
+            database.flush()
+        # Reads see all earlier writes
+        done = threading.Event()
+        database.get_scans(lambda _scans: done.set())
+        done.wait()
+        database.stop()
+        database.join()
+        os.remove(path)
+
+    print 'Database writes ({} signals, {} per scan)'.format(args.count,
+                                                             args.signals)
+
+    try:
+        timeLoop = timeit.timeit(loop, number=args.runs) / args.runs
+        timeBatch = timeit.timeit(batched, number=args.runs) / args.runs
+    finally:
+        shutil.rmtree(folder)
+
+    print '\tTransaction per signal:\t{:.0f} signals/s'.format(args.count /
+                                                              timeLoop)
+    print '\tBatched:\t\t{:.0f} signals/s'.format(args.count / timeBatch)
+
+
+# Original polling dispatcher, used as a reference
+def dispatch_poll(queue, count):
+    latencies = []
+    while len(latencies) < count:
+        if not queue.empty():
+            event = queue.get()
+            latencies.append(time.time() - event.get_time())
+        else:
+            time.sleep(0.1)
+
+    return latencies
+
+
+def dispatch_wait(queue, count):
+    latencies = []
+    while len(latencies) < count:
+        event = events.get_event(queue)
+        if event is not None:
+            latencies.append(time.time() - event.get_time())
+
+    return latencies
+
+
+# Post events at random intervals (s) from another thread
+def post_events(queue, count, interval):
+    def post():
+        for _i in range(count):
+            time.sleep(numpy.random.uniform(0, interval * 2))
+            events.Post(queue).info('Benchmark')
+
+    thread = threading.Thread(target=post, name='Post')
+    thread.start()
+
+    return thread
+
+
+def bench_events(args):
+    print 'Event latency ({} events, {}ms mean interval)'.format(
+        args.count, args.interval)
+
+    interval = args.interval / 1e3
+    for name, dispatch in [('Polling', dispatch_poll),
+                           ('Waiting', dispatch_wait)]:
+        queue = Queue.Queue()
+        thread = post_events(queue, args.count, interval)
+        latencies = numpy.array(dispatch(queue, args.count)) * 1e3
+        thread.join()
+        print '\t{}:\t{:.1f}ms mean, {:.1f}ms max'.format(name,
+                                                         latencies.mean(),
+                                                         latencies.max())
+
+
+def main(argList=None):
+    parser = argparse.ArgumentParser(description='Harrier benchmarks',
+                                     formatter_class=ArgparseFormatter)
+    parser.add_argument('-r', '--runs', help='Number of runs',
+                        type=int, default=5)
+    subparser = parser.add_subparsers(help='Benchmark')
+
+    parserPeaks = subparser.add_parser('peaks', help='Scan peak detection')
+    parserPeaks.add_argument('-n', '--count', help='Number of spectra',
+                             type=int, default=20)
+    parserPeaks.add_argument('capture', help='IQ bin file', nargs='?')
+    parserPeaks.set_defaults(func=bench_peaks)
+
+    parserGhosts = subparser.add_parser('ghosts', help='Ghost removal')
+    parserGhosts.add_argument('-c', '--chunks', help='Chunks per signal',
+                              type=int, default=2343)
+    parserGhosts.add_argument('counts', help='Numbers of detections',
+                              type=int, nargs='*', default=[10, 100, 500])
+    parserGhosts.set_defaults(func=bench_ghosts)
+
+    parserZoom = subparser.add_parser('zoom', help='Zoomed scan')
+    parserZoom.add_argument('-n', '--count', help='Number of tones',
+                            type=int, default=20)
+    parserZoom.add_argument('capture', help='IQ bin file', nargs='?')
+    parserZoom.set_defaults(func=bench_zoom)
+
+    parserEvents = subparser.add_parser('events', help='Event latency')
+    parserEvents.add_argument('-n', '--count', help='Number of events',
+                              type=int, default=40)
+    parserEvents.add_argument('-i', '--interval',
+                              help='Mean interval between events (ms)',
+                              type=float, default=150)
+    parserEvents.set_defaults(func=bench_events)
+
+    parserDb = subparser.add_parser('database', help='Database writes')
+    parserDb.add_argument('-n', '--count', help='Number of signals',
+                          type=int, default=10000)
+    parserDb.add_argument('-s', '--signals', help='Signals per scan',
+                          type=int, default=10)
+    parserDb.add_argument('-f', '--flush', help='Flush interval (s)',
+                          type=float, default=1)
+    parserDb.set_defaults(func=bench_database)
+
+    args = parser.parse_args(argList)
+
+    if 'capture' in args and args.capture is not None and \
+            not os.path.isfile(args.capture):
+        Utils.error('Cannot find bin file')
+
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
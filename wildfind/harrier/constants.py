@@ -34,6 +34,9 @@ GPS_RETRY = 5
 # Maximum age for a valid location (seconds)
 GPS_AGE = 5
 
+# Longest time database writes are held before committing (seconds)
+DB_FLUSH = 1
+
 
 if __name__ == '__main__':
     print 'Please run harrier.py'
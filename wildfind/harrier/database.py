@@ -32,24 +32,37 @@ import time
 
 from wildfind.common.database import create_database, name_factory
 from wildfind.harrier import events
+from wildfind.harrier.constants import DB_FLUSH
 
 GET_SCANS, \
     ADD_SIGNAL, GET_SIGNALS, \
     ADD_LOG, GET_LOG, \
-    CLOSE = range(6)
+    FLUSH, CLOSE = range(7)
 
+SQL_SCAN = 'insert or ignore into Scans values (?, ?, ?)'
+SQL_SIGNAL = 'insert into Signals values (null, ?, ?, ?, ?, ?, ?, ?)'
+SQL_LOG = 'insert into Log values (null, ?, ?)'
 
+
+# Writes are held for up to flush seconds and committed together, reads
+# see all the writes before them
 class Database(threading.Thread):
-    def __init__(self, path, notify):
+    def __init__(self, path, notify, flush=DB_FLUSH):
         threading.Thread.__init__(self)
         self.name = 'Database'
 
         self._path = path
         self._notify = notify
+        self._flush = flush
 
         self._conn = None
         self._queue = Queue.Queue()
 
+        self._scans = []
+        self._signals = []
+        self._logs = []
+        self._flushTime = None
+
         if os.path.exists(path):
             print 'Appending:\t{}'.format(path)
         else:
@@ -65,35 +78,54 @@ class Database(threading.Thread):
         if error is not None:
             events.Post(self._notify).error(error)
 
-    def __add_signal(self, **kwargs):
-        with self._conn:
-            timeStamp = int(kwargs['timeStamp'])
-            signal = kwargs['signal']
-            frequency = kwargs['frequency']
-            survey = kwargs['survey']
+        # A commit only syncs the write ahead log at checkpoints
+        self._conn.execute('pragma journal_mode = wal')
+        self._conn.execute('pragma synchronous = normal')
 
-            cmd = 'insert into Scans values(?, ?, ?)'
-            try:
-                self._conn.execute(cmd, (timeStamp, frequency, survey))
-            except sqlite3.IntegrityError:
-                pass
-
-            cmd = 'insert into Signals values (null, ?, ?, ?, ?, ?, ?, ?)'
-            self._conn.execute(cmd, (timeStamp,
-                                     signal.freq,
-                                     signal.mod,
-                                     signal.rate,
-                                     signal.level,
-                                     signal.lon,
-                                     signal.lat))
+    def __is_pending(self):
+        return self._flushTime is not None
+
+    def __schedule_commit(self):
+        if self._flushTime is None:
+            self._flushTime = time.time() + self._flush
+
+    def __add_signal(self, **kwargs):
+        timeStamp = int(kwargs['timeStamp'])
+        signal = kwargs['signal']
+        frequency = kwargs['frequency']
+        survey = kwargs['survey']
+
+        self._scans.append((timeStamp, frequency, survey))
+        self._signals.append((timeStamp,
+                              signal.freq,
+                              signal.mod,
+                              signal.rate,
+                              signal.level,
+                              signal.lon,
+                              signal.lat))
+        self.__schedule_commit()
 
     def __add_log(self, **kwargs):
+        timeStamp = int(kwargs['timeStamp'])
+        message = kwargs['message']
+
+        self._logs.append((timeStamp, message))
+        self.__schedule_commit()
+
+    # Commit the pending writes as one transaction
+    def __commit(self):
+        if not self.__is_pending():
+            return
+
         with self._conn:
-            timeStamp = int(kwargs['timeStamp'])
-            message = kwargs['message']
+            self._conn.executemany(SQL_SCAN, self._scans)
+            self._conn.executemany(SQL_SIGNAL, self._signals)
+            self._conn.executemany(SQL_LOG, self._logs)
 
-            cmd = 'insert into Log values (null, ?, ?)'
-            self._conn.execute(cmd, (timeStamp, message))
+        self._scans = []
+        self._signals = []
+        self._logs = []
+        self._flushTime = None
 
     def __get_scans(self, callback):
         cursor = self._conn.cursor()
@@ -125,30 +157,34 @@ class Database(threading.Thread):
         self.__connect()
 
         while True:
-            if not self._queue.empty():
-                event = self._queue.get()
-                eventType = event.get_type()
-
-                if eventType == GET_SCANS:
-                    callback = event.get_arg('callback')
-                    self.__get_scans(callback)
-                elif eventType == ADD_SIGNAL:
-                    self.__add_signal(**event.get_args())
-                elif eventType == GET_SIGNALS:
-                    callback = event.get_arg('callback')
-                    self.__get_signals(callback)
-                elif eventType == ADD_LOG:
-                    self.__add_log(**event.get_args())
-                elif eventType == GET_LOG:
-                    callback = event.get_arg('callback')
-                    self.__get_log(callback)
-                elif eventType == CLOSE:
-                    break
-            else:
-                try:
-                    time.sleep(0.1)
-                except IOError:
-                    pass
+            timeout = None
+            if self.__is_pending():
+                timeout = max(0, self._flushTime - time.time())
+            try:
+                event = self._queue.get(timeout=timeout)
+            except Queue.Empty:
+                self.__commit()
+                continue
+            eventType = event.get_type()
+
+            if eventType not in [ADD_SIGNAL, ADD_LOG]:
+                self.__commit()
+
+            if eventType == GET_SCANS:
+                callback = event.get_arg('callback')
+                self.__get_scans(callback)
+            elif eventType == ADD_SIGNAL:
+                self.__add_signal(**event.get_args())
+            elif eventType == GET_SIGNALS:
+                callback = event.get_arg('callback')
+                self.__get_signals(callback)
+            elif eventType == ADD_LOG:
+                self.__add_log(**event.get_args())
+            elif eventType == GET_LOG:
+                callback = event.get_arg('callback')
+                self.__get_log(callback)
+            elif eventType == CLOSE:
+                break
 
         self._conn.close()
 
@@ -199,6 +235,11 @@ class Database(threading.Thread):
         event = events.Event(GET_LOG, callback=callback)
         self._queue.put(event)
 
+    # Commit pending writes without waiting for the flush interval
+    def flush(self):
+        event = events.Event(FLUSH)
+        self._queue.put(event)
+
     def stop(self):
         event = events.Event(CLOSE)
         self._queue.put(event)
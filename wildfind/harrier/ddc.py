@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+#
+#
+# Wild Find
+#
+#
+# Copyright 2014 - 2017 Al Brown
+#
+# Wildlife tracking and mapping
+#
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import numpy
+from scipy import fftpack
+
+
+# Decimation of each stream, also the number of channels
+DDC_DECIMATION = 1024
+# Length of the prototype filter (decimated samples)
+DDC_BLOCKS = 2
+# Cut off of the prototype filter relative to the stream sample rate
+DDC_CUTOFF = 0.75
+# Blocks filtered in each batch
+DDC_BATCH = 512
+# Maximum number of frequencies mixed directly rather than with an FFT
+DDC_SPARSE = 16
+
+
+# Taps (blocks x decimation) of a Hann windowed sinc low pass filter,
+# oldest block first
+def _prototype():
+    length = DDC_DECIMATION * DDC_BLOCKS
+    times = numpy.arange(length) - (length - 1) / 2.
+    taps = numpy.sinc(times * 2 * DDC_CUTOFF / DDC_DECIMATION)
+    taps *= numpy.hanning(length)
+    taps /= numpy.sum(taps)
+
+    taps = taps[::-1].reshape(DDC_BLOCKS, DDC_DECIMATION)
+
+    return taps.astype(numpy.float32)
+
+
+# Polyphase channelizer, down converts each frequency into a decimated
+# narrowband stream at fs / DDC_DECIMATION and returns its envelope
+# Small numbers of frequencies are mixed and filtered as a matrix product,
+# otherwise the streams are the FFT channels nearest to the frequencies
+class Channelizer(object):
+    def __init__(self, fs, frequencies, sparse=None):
+        frequencies = numpy.asarray(frequencies, dtype=numpy.float64)
+        self._count = frequencies.size
+        self._taps = _prototype()
+
+        if sparse is None:
+            sparse = self._count <= DDC_SPARSE
+        self._sparse = sparse
+
+        channels = numpy.round(frequencies * DDC_DECIMATION / fs)
+        self._channels = channels.astype(numpy.int) % DDC_DECIMATION
+
+        self._weights = None
+        if self._sparse:
+            # Filter & mix for each block, with the phase between blocks
+            omegas = 2 * numpy.pi * frequencies / fs
+            offsets = numpy.arange(DDC_DECIMATION)
+            mix = numpy.exp(-1j * numpy.outer(offsets, omegas))
+            weights = []
+            for block, taps in enumerate(self._taps):
+                age = DDC_BLOCKS - 1 - block
+                weight = taps[:, numpy.newaxis] * mix
+                weight *= numpy.exp(1j * omegas * age * DDC_DECIMATION)
+                weights.append(weight)
+            self._weights = numpy.hstack(weights).astype(numpy.complex64)
+
+    def is_sparse(self):
+        return self._sparse
+
+    # Filtered blocks of the current batch, given the previous blocks
+    def __filter(self, batch, history):
+        if self._sparse:
+            products = numpy.dot(numpy.vstack((history, batch)),
+                                 self._weights)
+            streams = numpy.zeros((batch.shape[0], self._count),
+                                  dtype=numpy.complex64)
+            for block in range(DDC_BLOCKS):
+                cols = slice(block * self._count, (block + 1) * self._count)
+                streams += products[block:block + batch.shape[0], cols]
+            return streams
+
+        blocks = numpy.vstack((history, batch))
+        filtered = batch * self._taps[-1]
+        weighted = numpy.empty_like(filtered)
+        for block in range(DDC_BLOCKS - 1):
+            numpy.multiply(blocks[block:block + batch.shape[0]],
+                           self._taps[block], out=weighted)
+            filtered += weighted
+        fft = fftpack.fft(filtered, axis=1, overwrite_x=True)
+        return fft[:, self._channels]
+
+    # Filtered batches of the decimated samples, with their positions
+    # Samples may also be consecutive windows, each a multiple of
+    # DDC_DECIMATION
+    def __batches(self, samples, size):
+        if isinstance(samples, numpy.ndarray):
+            samples = [samples]
+
+        history = numpy.zeros((DDC_BLOCKS - 1, DDC_DECIMATION),
+                              dtype=numpy.complex64)
+        pos = 0
+        for window in samples:
+            blocks = min(window.size / DDC_DECIMATION, size - pos)
+            matrix = window[:blocks * DDC_DECIMATION]
+            matrix = matrix.reshape(blocks, DDC_DECIMATION)
+            for start in range(0, blocks, DDC_BATCH):
+                batch = matrix[start:start + DDC_BATCH]
+                filtered = self.__filter(batch, history)
+                yield pos, filtered
+                pos += batch.shape[0]
+                # Copied as windows reuse their buffer
+                recent = numpy.vstack((history, batch))
+                history = recent[recent.shape[0] - DDC_BLOCKS + 1:].copy()
+
+    # Fill signals (decimated samples x frequencies) with the envelope of
+    # each stream
+    def demod(self, samples, signals):
+        for pos, filtered in self.__batches(samples, signals.shape[0]):
+            signals[pos:pos + filtered.shape[0]] = numpy.absolute(filtered)
+
+    # Fill signals with the channels nearest the frequencies from the
+    # envelopes of every channel
+    def select(self, levels, signals):
+        if signals.dtype == levels.dtype:
+            numpy.take(levels, self._channels, axis=1, out=signals)
+        else:
+            signals[:] = levels[:, self._channels]
+
+
+if __name__ == '__main__':
+    print 'Please run harrier.py'
+    exit(1)
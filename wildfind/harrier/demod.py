@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+#
+#
+# Wild Find
+#
+#
+# Copyright 2014 - 2017 Al Brown
+#
+# Wildlife tracking and mapping
+#
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import numpy
+from scipy import fftpack
+
+
+# Size of each block to analyse
+DEMOD_BINS = 4096
+# Chunks transformed in each batch
+DEMOD_BATCH = 256
+# Maximum number of frequencies evaluated with a DFT rather than an FFT
+DEMOD_SPARSE = 16
+
+
+# Batched demodulation of the FFT bins nearest to frequencies
+# Small numbers of frequencies are evaluated as a DFT matrix product
+class Demod(object):
+    def __init__(self, fs, frequencies, sparse=None):
+        bins = numpy.round(numpy.asarray(frequencies) * DEMOD_BINS / fs)
+        self._bins = bins.astype(numpy.int) % DEMOD_BINS
+
+        if sparse is None:
+            sparse = len(self._bins) <= DEMOD_SPARSE
+        self._sparse = sparse
+        # Every bin in order, no selection needed
+        self._every = numpy.array_equal(self._bins, numpy.arange(DEMOD_BINS))
+
+        self._dft = None
+        if self._sparse:
+            phases = numpy.outer(numpy.arange(DEMOD_BINS), self._bins)
+            phases %= DEMOD_BINS
+            dft = numpy.exp(-2j * numpy.pi * phases / DEMOD_BINS)
+            dft /= DEMOD_BINS
+            self._dft = dft.astype(numpy.complex64)
+
+    def is_sparse(self):
+        return self._sparse
+
+    # Fill signals (chunks x frequencies) with the levels of each chunk
+    # Samples may also be consecutive windows, each a multiple of DEMOD_BINS
+    def demod(self, samples, signals):
+        if not isinstance(samples, numpy.ndarray):
+            pos = 0
+            for window in samples:
+                chunks = min(window.size / DEMOD_BINS, signals.shape[0] - pos)
+                self.demod(window, signals[pos:pos + chunks])
+                pos += chunks
+            return
+
+        chunks = signals.shape[0]
+        matrix = samples[:chunks * DEMOD_BINS].reshape(chunks, DEMOD_BINS)
+
+        for start in range(0, chunks, DEMOD_BATCH):
+            batch = matrix[start:start + DEMOD_BATCH]
+            if self._sparse:
+                levels = numpy.dot(batch, self._dft)
+            else:
+                fft = fftpack.fft(batch, axis=1)
+                if self._every:
+                    levels = fft
+                else:
+                    levels = fft[:, self._bins]
+                levels /= DEMOD_BINS
+            signals[start:start + batch.shape[0]] = numpy.absolute(levels)
+
+    # Fill signals with the frequencies from the levels of every bin
+    def select(self, levels, signals):
+        if signals.dtype == levels.dtype:
+            numpy.take(levels, self._bins, axis=1, out=signals)
+        else:
+            signals[:] = levels[:, self._bins]
+
+
+# Levels of every FFT bin of each chunk, demodulated as samples arrive
+class DemodStream(object):
+    def __init__(self, chunks):
+        self._levels = numpy.empty((chunks, DEMOD_BINS), dtype=numpy.float16)
+        self._tail = numpy.empty(DEMOD_BINS, dtype=numpy.complex64)
+        self._tailSize = 0
+        self._chunk = 0
+
+    def __transform(self, matrix):
+        chunks = min(matrix.shape[0], self._levels.shape[0] - self._chunk)
+
+        for start in range(0, chunks, DEMOD_BATCH):
+            batch = matrix[start:min(start + DEMOD_BATCH, chunks)]
+            fft = fftpack.fft(batch, axis=1)
+            fft /= DEMOD_BINS
+            pos = self._chunk
+            self._levels[pos:pos + batch.shape[0]] = numpy.absolute(fft)
+            self._chunk += batch.shape[0]
+
+    def reset(self):
+        self._tailSize = 0
+        self._chunk = 0
+
+    # Demodulate the next samples of the stream
+    def update(self, samples):
+        pos = 0
+        if self._tailSize:
+            pos = min(DEMOD_BINS - self._tailSize, samples.size)
+            self._tail[self._tailSize:self._tailSize + pos] = samples[:pos]
+            self._tailSize += pos
+            if self._tailSize < DEMOD_BINS:
+                return
+            self.__transform(self._tail[numpy.newaxis])
+            self._tailSize = 0
+
+        chunks = (samples.size - pos) / DEMOD_BINS
+        end = pos + chunks * DEMOD_BINS
+        self.__transform(samples[pos:end].reshape(chunks, DEMOD_BINS))
+
+        self._tailSize = samples.size - end
+        self._tail[:self._tailSize] = samples[end:]
+
+    # Levels (chunks x bins) of the chunks demodulated so far
+    def get_levels(self):
+        return self._levels[:self._chunk]
+
+
+if __name__ == '__main__':
+    print 'Please run harrier.py'
+    exit(1)
@@ -24,23 +24,25 @@
 
 import itertools
 import operator
+import time
 
 import numpy
-from scipy import fftpack
 
 from wildfind.harrier import collar
-from wildfind.harrier.constants import SAMPLE_TIME
+from wildfind.harrier.ddc import Channelizer, DDC_DECIMATION
+from wildfind.harrier.demod import Demod, DEMOD_BINS
+from wildfind.harrier.matched import comb_correlate, MATCH_SCORE
 from wildfind.harrier.utils import Utils
 
 
-# Size of each block to analyse
-DEMOD_BINS = 4096
 # Valid pulse widths (s)
 PULSE_WIDTHS = [10e-3, 25e-3, 64e-3]
 # Pulse width tolerance (+/- %)
 PULSE_WIDTH_TOL = 75
 # Minimum high to low level ratio
 PULSE_LEVEL_RATIO = 5
+# Minimum number of pulses in a train
+PULSE_MIN = 3
 # Maximum pulse rate deviation (%)
 PULSE_RATE_DEVIATION = 15
 # Valid pulse rates (Pulses per minute)
@@ -55,66 +57,205 @@ TONE_TOL = 10
 GHOST_RATE_TOL = 5
 # Correlation of ghosts (%)
 GHOST_CORR = 33
+# Correlations closer than this to GHOST_CORR are calculated individually
+GHOST_MARGIN = 0.01
+# Detections below which ghosts are found pair by pair rather than with a
+# correlation matrix
+GHOST_PAIRWISE = 16
+# Minimum skewness of the levels of a pulsed signal
+REJECT_SKEW = 0.5
 # Channel spacing (Hz)
 CHANNEL_SPACE = 20e3
+# Length of the smoothing moving average (samples of each DEMOD_BINS chunk)
+SMOOTH_LENGTH = 4
+
+
+# Zero-lag correlation matrix of the leading & lagging normalised signals
+# Values close to the threshold are recalculated as single correlations
+def _correlate(leading, lagging, threshold):
+    corr = numpy.dot(leading.astype(numpy.float32),
+                     lagging.astype(numpy.float32).T)
+
+    close = numpy.argwhere(numpy.abs(corr - threshold) < GHOST_MARGIN)
+    for i, j in close:
+        corr[i, j] = numpy.correlate(leading[i], lagging[j])[0]
+
+    return corr > threshold
+
+
+# Detected collars split into groups of similar rates, strongest first
+def _rate_groups(detected):
+    rates = [collar.rate for collar in detected]
+    rates.sort()
+    df = numpy.diff(rates)
+    pos = numpy.where(df > GHOST_RATE_TOL)[0] + 1
+
+    groups = []
+    for group in numpy.split(rates, pos):
+        collars = [collar for collar in detected
+                   if collar.rate in group]
+        collars.sort(key=operator.attrgetter('level'), reverse=True)
+        groups.append(collars)
+
+    return groups
+
+
+# Find ghosts by correlating each pair of collars in a group in turn
+def find_ghosts_pairwise(signals, detected):
+    threshold = GHOST_CORR / 100.
+
+    ghosts = set()
+    for collars in _rate_groups(detected):
+        for stronger, weaker in itertools.combinations(collars, 2):
+            a = signals[stronger.signalNum]
+            v = signals[weaker.signalNum]
+            a = (a - numpy.mean(a)) / (numpy.std(a, dtype=numpy.float32) *
+                                       len(a))
+            v = (v - numpy.mean(v)) / numpy.std(v, dtype=numpy.float32)
+            if numpy.correlate(a, v)[0] > threshold:
+                ghosts.add(weaker)
+
+    return ghosts
+
+
+# Find ghosts with a correlation matrix of every collar
+def find_ghosts_matrix(signals, detected):
+    # Order by group, then by level
+    ordered = []
+    groupNums = []
+    for groupNum, collars in enumerate(_rate_groups(detected)):
+        ordered.extend(collars)
+        groupNums.extend([groupNum] * len(collars))
+
+    # Normalise each signal once
+    length = signals.shape[1]
+    leading = numpy.empty((len(ordered), length), dtype=signals.dtype)
+    lagging = numpy.empty((len(ordered), length), dtype=signals.dtype)
+    for i, collar in enumerate(ordered):
+        signal = signals[collar.signalNum]
+        offset = signal - numpy.mean(signal)
+        std = numpy.std(signal, dtype=numpy.float32)
+        leading[i] = offset / (std * length)
+        lagging[i] = offset / std
+
+    corr = _correlate(leading, lagging, GHOST_CORR / 100.)
+
+    # Remove collars correlating with a stronger collar in their group
+    groupNums = numpy.array(groupNums)
+    corr &= groupNums[:, numpy.newaxis] == groupNums
+    ghosts = numpy.triu(corr, 1).any(axis=0)
+
+    return set([ordered[i] for i in numpy.flatnonzero(ghosts)])
+
+
+# Find ghosts, detected collars which correlate with a stronger collar of
+# a similar rate
+# The matrix is only faster with more than a few detections
+def find_ghosts(signals, detected):
+    if len(detected) < 2:
+        return set()
+    if len(detected) < GHOST_PAIRWISE:
+        return find_ghosts_pairwise(signals, detected)
+
+    return find_ghosts_matrix(signals, detected)
 
 
 class Detect(object):
-    def __init__(self, fs, samples, frequencies, timing=None, debug=None):
+    def __init__(self, fs, samples, frequencies, timing=None, debug=None,
+                 pool=None, channelize=False, workspace=None,
+                 storeSignals=True, match=False, tail=None):
         self._fs = fs
         self._samples = samples
         self._frequencies = frequencies
+        self._channelize = channelize
+        self._match = match
+        # Levels of every bin preceding the samples
+        self._tail = tail
+        # Chunks of each signal per second
+        self._chunkRate = fs / float(DEMOD_BINS)
+        if channelize:
+            self._chunkRate = fs / float(DDC_DECIMATION)
+        self._workspace = workspace
+        self._storeSignals = storeSignals
         self._signals = []
         self._timing = timing
         self._debug = debug
+        self._pool = pool
+        # Signals searched, passing the level & edge tests, and collars found
+        self._stages = [0, 0, 0, 0]
 
-    # Find pulse edges
+    # Find pulse edges of each signal (signals x chunks)
+    # Returns the thresholds and edge indices of each signal
     def __find_edges(self, signals, pulseWidths):
-        minPulses = SAMPLE_TIME * min(PULSE_RATES) / 60.
+        if not signals.shape[0]:
+            return []
+
+        duration = signals.shape[1] / self._chunkRate
+        minPulses = duration * min(PULSE_RATES) / 60.
         minHigh = minPulses * min(min(pulseWidths)) / 1e3
-        threshold = 1 - (minHigh / SAMPLE_TIME)
+        threshold = 1 - (minHigh / duration)
         threshold *= 100
 
-        t1 = numpy.percentile(signals, threshold)
-        t2 = numpy.percentile(signals, threshold - 5)
+        t2, t1 = numpy.percentile(signals, [threshold - 5, threshold],
+                                  axis=1)
         offset = (t1 - t2) / 3.
         threshHigh = t1 - offset
         threshLow = t2 + offset
 
-        high = signals >= threshHigh
-        low = signals <= threshLow
-        both = high | low
-        indicesBoth = numpy.nonzero(both)[0]
-        counter = numpy.cumsum(both)
-        edges = numpy.where(counter, high[indicesBoth[counter - 1]], False)
-
-        indicesEdge = numpy.nonzero(numpy.diff(edges))[0]
-        indicesPos = indicesEdge[0::2]
-        indicesNeg = indicesEdge[1::2]
-
-        edgeDiff = abs(indicesPos.size - indicesNeg.size)
-        if edgeDiff > 1:
-            return (threshHigh, threshLow,
-                    numpy.array([]), numpy.array([]))
-        elif edgeDiff == 1:
-            minSize = min(len(indicesPos), len(indicesNeg))
-            indicesPos = indicesPos[:minSize]
-            indicesPos = indicesPos[:minSize]
-
-        return (threshHigh, threshLow,
-                indicesPos, indicesNeg)
+        # Compare at single precision, thresholds at the signal precision
+        levels = signals.astype(numpy.float32)
+        threshHighs = threshHigh.astype(signals.dtype).astype(numpy.float32)
+        threshLows = threshLow.astype(signals.dtype).astype(numpy.float32)
+        high = levels >= threshHighs[:, numpy.newaxis]
+        both = levels <= threshLows[:, numpy.newaxis]
+        both |= high
+
+        # Hysteresis, edges are where the state past the thresholds changes
+        rows, cols = numpy.nonzero(both)
+        states = high[rows, cols]
+        starts = numpy.ones(rows.size, dtype=numpy.bool_)
+        starts[1:] = rows[1:] != rows[:-1]
+        previous = numpy.roll(states, 1)
+        previous[starts] = False
+        changes = (states != previous) & (cols > 0)
+        rowsEdge = rows[changes]
+        indicesEdge = cols[changes] - 1
+
+        # Split edges into each signal
+        counts = numpy.bincount(rowsEdge, minlength=signals.shape[0])
+        indicesEdges = numpy.split(indicesEdge, numpy.cumsum(counts)[:-1])
+
+        found = []
+        for i, indicesEdge in enumerate(indicesEdges):
+            indicesPos = indicesEdge[0::2]
+            indicesNeg = indicesEdge[1::2]
+
+            edgeDiff = abs(indicesPos.size - indicesNeg.size)
+            if edgeDiff > 1:
+                indicesPos = numpy.array([])
+                indicesNeg = numpy.array([])
+            elif edgeDiff == 1:
+                minSize = min(len(indicesPos), len(indicesNeg))
+                indicesPos = indicesPos[:minSize]
+                indicesPos = indicesPos[:minSize]
+
+            found.append((threshHigh[i], threshLow[i],
+                          indicesPos, indicesNeg))
+
+        return found
 
     # Find pulses
     def __find_pulses(self, signal, negIndices, posIndices, pulseWidths):
         pulse = None
         length = signal.size
+        maxPulses = self.__max_pulses(length)
         # Find pulses of pulseWidths
         widths = negIndices - posIndices
 
         for wMax, wMin in pulseWidths:
             posValid = numpy.where((widths > wMin) & (widths < wMax))[0]
-            # Must have between 3 and 6 pulses
-            if posValid.size > 2 and posValid.size < 7 and posValid.size == widths.size:
+            # Must have between PULSE_MIN and maxPulses pulses
+            if posValid.size >= PULSE_MIN and posValid.size <= maxPulses and posValid.size == widths.size:
                 pulseValid = posIndices[posValid]
                 pulseRate = numpy.diff(pulseValid)
                 pulseAvg = numpy.average(pulseRate)
@@ -122,7 +263,7 @@ class Detect(object):
                 maxDeviation = pulseAvg * PULSE_RATE_DEVIATION / 100.
                 if numpy.std(pulseRate) < maxDeviation:
                     # Calculate frequency
-                    freq = length / (pulseAvg * float(SAMPLE_TIME))
+                    freq = self._chunkRate / pulseAvg
                     rate = freq * 60
                     # Limit to PULSE_RATES
                     closest = min(PULSE_RATES,
@@ -142,7 +283,7 @@ class Detect(object):
                             pulse = collar.Collar(widths.size,
                                                   freq * 60.,
                                                   level,
-                                                  width * SAMPLE_TIME * 1000. / length)
+                                                  width * 1000. / self._chunkRate)
                             break
                         elif self._debug is not None and self._debug.verbose:
                             Utils.error('Missing pulses',
@@ -152,8 +293,8 @@ class Detect(object):
                                     False)
                 elif self._debug is not None and self._debug.verbose:
                     msg = 'Collar rate deviation {:.1f} >= {:.1f}ms'
-                    msg = msg.format(1000 * numpy.std(pulseRate) * SAMPLE_TIME / length,
-                                     1000 * maxDeviation * SAMPLE_TIME / length)
+                    msg = msg.format(1000 * numpy.std(pulseRate) / self._chunkRate,
+                                     1000 * maxDeviation / self._chunkRate)
                     Utils.error(msg, False)
             elif self._debug is not None and self._debug.verbose:
                 Utils.error('Invalid number of pulses ({}) or invalid pulse widths'.format(posValid.size),
@@ -161,12 +302,13 @@ class Detect(object):
 
         return pulse
 
-    # Find tone ranges and return a pulse based on the signal
+    # Find the tone in freqs matching most edge widths
+    # Returns its frequency, the edge indices and the matching widths
     def __find_tone(self, signal, indices, freqs):
         if not len(indices):
-            return None, None
+            return None, None, None
 
-        sampleRate = signal.size / float(SAMPLE_TIME)
+        sampleRate = self._chunkRate
         periods = [sampleRate / freq for freq in freqs]
         periods = Utils.calc_tolerances(periods, TONE_TOL)
 
@@ -176,48 +318,52 @@ class Detect(object):
         widths = numpy.diff(indices)
 
         # Count valid widths for each period
-        counts = []
-        for maxPeriod, minPeriod in periods:
-            valid = (widths > minPeriod) & (widths < maxPeriod)
-            counts.append(numpy.sum(valid))
+        maxPeriods, minPeriods = numpy.array(periods).T
+        valid = ((widths[:, numpy.newaxis] > minPeriods) &
+                 (widths[:, numpy.newaxis] < maxPeriods))
+        counts = numpy.sum(valid, axis=0)
         # Find maximum
-        maxCounts = max(counts)
-        if maxCounts == 0:
+        maxPos = numpy.argmax(counts)
+        if counts[maxPos] == 0:
             if self._debug is not None and self._debug.verbose:
                 Utils.error('No tone found', False)
-            return None, None
-        maxPos = counts.index(maxCounts)
-        maxPeriod, minPeriod = periods[maxPos]
+            return None, None, None
         # Matching widths
-        periodsValid = (widths > minPeriod) & (widths < maxPeriod)
+        periodsValid = valid[:, maxPos]
         periodAvg = numpy.average(widths[periodsValid])
         freq = sampleRate / periodAvg
 
-        # Create pulses from signal
+        return freq, indices, periodsValid
+
+    # Create pulses from the level of each matching tone cycle
+    def __tone_pulse(self, signal, indices, periodsValid):
+        end = indices[-1]
+        widths = numpy.diff(indices)
+        sums = numpy.add.reduceat(signal[:end].astype(numpy.float64),
+                                  indices[:-1])
+        levels = numpy.abs((sums / widths).astype(numpy.float16))
+        levels[~periodsValid] = 0
+
         pulse = numpy.zeros((signal.size), dtype=numpy.float16)
-        pos = 0
-        for i in range(widths.size):
-            width = widths[i]
-            valid = periodsValid[i]
-            signalPos = indices[i]
-            level = numpy.average(signal[signalPos:signalPos + width])
-            level = abs(level)
-            pulse[pos:pos + width].fill(valid * level)
-            pos += width
-
-        return freq, pulse
+        pulse[:end] = numpy.repeat(levels, widths)
+
+        return pulse
 
     # Find AM signal
     def __find_am(self, signal, posIndices, negIndices):
         # Find +ve cycles
-        freq, amPos = self.__find_tone(signal, posIndices, TONES)
+        freq, posIndices, posValid = self.__find_tone(signal, posIndices,
+                                                      TONES)
         if freq is None:
             return None, [], []
         # Find matching -ve cycle
-        freq, amNeg = self.__find_tone(signal, negIndices, [freq])
+        freq, negIndices, negValid = self.__find_tone(signal, negIndices,
+                                                      [freq])
         if freq is None:
             return None, [], []
         # Average +/- ve pulses
+        amPos = self.__tone_pulse(signal, posIndices, posValid)
+        amNeg = self.__tone_pulse(signal, negIndices, negValid)
         am = (amPos + amNeg) / 2.
 
         # Find edges
@@ -235,65 +381,262 @@ class Detect(object):
 
         return am, amPosIndices, amNegIndices
 
-    # Smooth signal & remove DC offset
-    def __smooth(self, signals, boxLen):
-        box = numpy.ones(boxLen) / float(boxLen)
+    # Smooth signals with a moving average & remove DC offset
+    def __smooth(self, signals, boxLen, signalNums=None):
+        if signalNums is None:
+            signalNums = slice(None)
+        selected = signals[signalNums].astype(numpy.float64)
+        chunks = selected.shape[1]
+
+        smoothed = numpy.zeros_like(selected)
+        start = (boxLen - 1) / 2
+        for shift in range(start - boxLen + 1, start + 1):
+            if shift >= 0:
+                smoothed[:, :chunks - shift] += selected[:, shift:]
+            else:
+                smoothed[:, -shift:] += selected[:, :shift]
+        smoothed /= boxLen
+        smoothed = smoothed.astype(signals.dtype)
+
+        # Single precision, as used by half precision arithmetic
+        means = numpy.mean(smoothed, axis=1).astype(numpy.float32)
+        smoothed = smoothed.astype(numpy.float32)
+        smoothed -= means[:, numpy.newaxis]
+        signals[signalNums] = smoothed
+
+    # Valid pulse widths with PULSE_WIDTH_TOL tolerance
+    def __pulse_widths(self):
+        pulseWidths = [width * self._chunkRate
+                       for width in sorted(PULSE_WIDTHS)]
+        return Utils.calc_tolerances(pulseWidths, PULSE_WIDTH_TOL)
+
+    # Most pulses of the fastest rate in a signal of length chunks
+    def __max_pulses(self, length):
+        duration = length / self._chunkRate
+        return int(duration * max(PULSE_RATES) / 60.) + 1
+
+    # Find a CW or AM collar in a signal from its edges
+    # Pulses are limited to searchWidths
+    def __analyse(self, signal, edges, searchWidths):
+        threshPos, threshNeg, posIndices, negIndices = edges
+
+        # Find CW collars
+        pulse = self.__find_pulses(signal,
+                                   negIndices, posIndices,
+                                   searchWidths)
+
+        # Find AM collars
+        if pulse is None:
+            if self._debug is not None and not self._debug.disableAm:
+                am, posIndicesAm, negIndicesAm = self.__find_am(signal,
+                                                                posIndices,
+                                                                negIndices)
+            if self._debug is not None:
+                if not self._debug.disableAm and am is not None:
+                    pulse = self.__find_pulses(am,
+                                               negIndicesAm, posIndicesAm,
+                                               searchWidths)
+                    if pulse is not None:
+                        pulse.mod = collar.AM
+                        posIndices = posIndicesAm
+                        negIndices = negIndicesAm
+        else:
+            pulse.mod = collar.CW
+
+        return pulse, threshPos, threshNeg, posIndices, negIndices
+
+    # Reject signals without skewed levels, pulses are rare high levels
+    # Returns the remaining signals, all signals are kept if debugging
+    def __reject_level(self, signals, signalNums):
+        self._stages[0] += len(signalNums)
+        if self._debug is not None or not len(signalNums):
+            self._stages[1] += len(signalNums)
+            return signalNums
+
+        # Moments along the chunks of each signal
+        levels = signals.T[:, signalNums].astype(numpy.float32)
+        levels -= numpy.mean(levels, axis=0)
+        powers = levels ** 2
+        variance = numpy.mean(powers, axis=0)
+        powers *= levels
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            skew = numpy.mean(powers, axis=0) / variance ** 1.5
+
+        signalNums = [signalNum
+                      for signalNum, valid in zip(signalNums,
+                                                  skew > REJECT_SKEW)
+                      if valid]
+        self._stages[1] += len(signalNums)
+
+        return signalNums
+
+    # True if edges can contain a valid number of pulses, or if debugging
+    def __has_pulses(self, edges, maxPulses):
+        if self._debug is not None:
+            return True
+        return PULSE_MIN <= len(edges[2]) <= maxPulses
+
+    # Channel of a signal
+    def __channel(self, signalNum, baseband):
+        freq = self._frequencies[signalNum] + baseband
+        return int(round(freq / CHANNEL_SPACE) * CHANNEL_SPACE)
+
+    # Set the frequency and rate of a found collar
+    def __identify(self, pulse, signalNum, baseband):
+        pulse.signalNum = signalNum
+        pulse.freq = self.__channel(signalNum, baseband)
+        pulse.rate = min(PULSE_RATES, key=lambda x: abs(x - pulse.rate))
+
+    # Find pulses in a subset of signals
+    # Returns the number of signals passing the edge test and the pulses
+    def analyse(self, signals, signalNums):
+        pulseWidths = self.__pulse_widths()
+        maxPulses = self.__max_pulses(signals.shape[1])
+
+        edges = self.__find_edges(signals[signalNums], pulseWidths)
+
+        passed = 0
+        pulses = []
+        for signalNum, signalEdges in zip(signalNums, edges):
+            if not self.__has_pulses(signalEdges, maxPulses):
+                continue
+            passed += 1
+            pulse = self.__analyse(signals[signalNum], signalEdges,
+                                   pulseWidths)[0]
+            if pulse is not None:
+                pulses.append((signalNum, pulse))
+
+        return passed, pulses
+
+    # Confirm the collars of tracked signals from the correlation with pulse
+    # trains of their template, the template rate must correlate best
+    def __match(self, signals, baseband, signalNums, tracks):
+        if not len(signalNums):
+            return []
+
+        if self._timing is not None:
+            self._timing.start('Match')
+
+        sampleRate = self._chunkRate
+        rows = []
+        widths = []
+        periods = []
+        for signalNum in signalNums:
+            rate, width, _mod = tracks[signalNum].get_template()
+            for candidate in [rate] + PULSE_RATES:
+                rows.append(signalNum)
+                widths.append(width * sampleRate / 1000.)
+                periods.append(sampleRate * 60. / candidate)
+
+        scores, starts, levels, counts = comb_correlate(signals[rows],
+                                                        widths, periods)
+
+        collars = []
+        candidates = len(PULSE_RATES) + 1
+        for i, signalNum in enumerate(signalNums):
+            row = i * candidates
+            best = row + numpy.argmax(scores[row:row + candidates])
+            if scores[row] < MATCH_SCORE or \
+                    abs(periods[best] - periods[row]) > \
+                    periods[row] * PULSE_RATE_TOL / 100.:
+                continue
+
+            rate, width, mod = tracks[signalNum].get_template()
+            pulse = collar.Collar(counts[row], rate, levels[row], width)
+            pulse.mod = mod
+            self.__identify(pulse, signalNum, baseband)
+            collars.append(pulse)
+            self._stages[3] += 1
+
+        if self._timing is not None:
+            self._timing.stop()
+
+        return collars
+
+    # Find pulses using the worker pool
+    def __detect_pool(self, signals, baseband, signalNums):
+        if self._timing is not None:
+            self._timing.start('Detect')
+
+        if self._storeSignals:
+            self._signals = list(signals)
+
+        passed, pulses = self._pool.detect(self._fs, self._frequencies,
+                                           signals.T.shape, signalNums,
+                                           self._channelize)
+        self._stages[2] += passed
+
+        collars = []
+        for signalNum, pulse in pulses:
+            self.__identify(pulse, signalNum, baseband)
+            collars.append(pulse)
+        self._stages[3] += len(collars)
 
-        for signalNum in range(signals.shape[0]):
-            signals[signalNum] = numpy.convolve(signals[signalNum],
-                                                box, mode='same')
-            signals[signalNum] -= numpy.average(signals[signalNum])
+        if self._timing is not None:
+            self._timing.stop()
+
+        return collars
+
+    # Find pulses and their frequency, tracked signals use the pulse
+    # widths of their collar and must match it
+    # When matching, tracked signals without pulses are then confirmed by
+    # correlation with their collar
+    def __detect(self, signals, baseband, signalNums=None, tracks=None):
+        if signalNums is None:
+            signalNums = range(len(signals))
+        searched = signalNums
+
+        if self._timing is not None:
+            self._timing.stage('Detect')
+            self._timing.start('Detect')
+        signalNums = self.__reject_level(signals, signalNums)
+        if self._timing is not None:
+            self._timing.stop()
+
+        if self._pool is not None and self._debug is None and \
+                tracks is None and self._pool.is_useful(len(signalNums)):
+            return self.__detect_pool(signals, baseband, signalNums)
 
-    # Find pulses and their frequency
-    def __detect(self, signals, baseband):
         collars = []
 
-        # Calculate valid pulse widths with PULSE_WIDTH_TOL tolerance
-        sampleRate = signals.shape[1] / float(SAMPLE_TIME)
-        pulseWidths = [width * sampleRate for width in sorted(PULSE_WIDTHS)]
-        pulseWidths = Utils.calc_tolerances(pulseWidths,
-                                            PULSE_WIDTH_TOL)
+        pulseWidths = self.__pulse_widths()
+        maxPulses = self.__max_pulses(signals.shape[1])
+        sampleRate = self._chunkRate
 
-        signalNum = 0
-        for signal in signals:
+        if self._timing is not None:
+            self._timing.start('Detect')
+        edges = self.__find_edges(signals[signalNums], pulseWidths)
+        if self._timing is not None:
+            self._timing.stop()
+
+        for signalNum, signalEdges in zip(signalNums, edges):
+            if not self.__has_pulses(signalEdges, maxPulses):
+                continue
+            self._stages[2] += 1
+
+            signal = signals[signalNum]
             if self._timing is not None:
                 self._timing.start('Detect')
 
-            self._signals.append(signal)
-
-            (threshPos, threshNeg,
-             posIndices, negIndices) = self.__find_edges(signal, pulseWidths)
-
-            # Find CW collars
-            pulse = self.__find_pulses(signal,
-                                       negIndices, posIndices,
-                                       pulseWidths)
-
-            # Find AM collars
-            if pulse is None:
-                if self._debug is not None and not self._debug.disableAm:
-                    am, posIndicesAm, negIndicesAm = self.__find_am(signal,
-                                                                    posIndices,
-                                                                    negIndices)
-                if self._debug is not None:
-                    if not self._debug.disableAm and am is not None:
-                        pulse = self.__find_pulses(am,
-                                                   negIndicesAm, posIndicesAm,
-                                                   pulseWidths)
-                        if pulse is not None:
-                            pulse.mod = collar.AM
-                            posIndices = posIndicesAm
-                            negIndices = negIndicesAm
-            else:
-                pulse.mod = collar.CW
+            if self._storeSignals:
+                self._signals.append(signal)
+
+            searchWidths = pulseWidths
+            if tracks is not None:
+                searchWidths = tracks[signalNum].get_widths(sampleRate)
+
+            (pulse,
+             threshPos, threshNeg,
+             posIndices, negIndices) = self.__analyse(signal, signalEdges,
+                                                      searchWidths)
+            if pulse is not None and tracks is not None and \
+                    not tracks[signalNum].is_match(pulse):
+                pulse = None
 
             if pulse is not None:
-                pulse.signalNum = signalNum
-                freq = self._frequencies[signalNum] + baseband
-                freq = int(round(freq / CHANNEL_SPACE) * CHANNEL_SPACE)
-                pulse.freq = freq
-                pulse.rate = min(PULSE_RATES, key=lambda x: abs(x - pulse.rate))
+                self.__identify(pulse, signalNum, baseband)
                 collars.append(pulse)
+                self._stages[3] += 1
 
             if self._timing is not None:
                 self._timing.stop()
@@ -304,96 +647,166 @@ class Detect(object):
                                           threshPos, threshNeg,
                                           posIndices, negIndices)
 
-            signalNum += 1
+        if self._match and tracks is not None:
+            found = set([pulse.signalNum for pulse in collars])
+            missed = [signalNum for signalNum in searched
+                      if signalNum not in found]
+            collars.extend(self.__match(signals, baseband, missed, tracks))
 
         return collars
 
-    # Demodulate blocks from capture
-    def __demod(self):
-        chunks = self._samples.size / DEMOD_BINS
+    # Demodulate blocks from capture, or channelize it into finer blocks,
+    # or select them from the levels of every bin
+    # Signals start with the blocks selected from the tail, if any
+    # With signalNums only those signals are demodulated into signals
+    def __demod(self, levels=None, signals=None, signalNums=None):
+        chunkSize = DEMOD_BINS
+        if levels is not None:
+            chunks = levels.shape[0]
+        else:
+            if self._channelize:
+                chunkSize = DDC_DECIMATION
+            chunks = self._samples.size / chunkSize
         if chunks == 0:
             Utils.error('Sample time too long')
 
-        signals = numpy.empty((chunks, len(self._frequencies)),
-                              dtype=numpy.float16)
-
-        # Split samples into chunks
-        freqBins = fftpack.fftfreq(DEMOD_BINS, 1. / self._fs)
-        freqInds = freqBins.argsort()
+        if self._timing is not None:
+            self._timing.stage('Demod')
+            self._timing.start('Demod')
+
+        # Single precision in a reused workspace, otherwise half precision
+        dtype = numpy.float16
+        if self._workspace is not None:
+            dtype = self._workspace.get_dtype()
+
+        tailChunks = 0
+        if self._tail is not None:
+            tailChunks = self._tail.shape[0]
+
+        if signals is None:
+            shape = (tailChunks + chunks, len(self._frequencies))
+            if self._pool is not None:
+                signals = self._pool.get_buffer(shape, dtype)
+            elif self._workspace is not None:
+                signals = self._workspace.get('signals', shape)
+            else:
+                signals = numpy.empty(shape, dtype=dtype)
+            signals = signals.T
+
+        if signalNums is not None and \
+                len(signalNums) == len(self._frequencies):
+            signalNums = None
+
+        if signalNums is None:
+            frequencies = self._frequencies
+            demodulated = signals.T[tailChunks:]
+        else:
+            frequencies = numpy.asarray(self._frequencies)[signalNums]
+            shape = (chunks, len(signalNums))
+            if self._workspace is not None:
+                demodulated = self._workspace.get('demodulated', shape)
+            else:
+                demodulated = numpy.empty(shape, dtype=dtype)
 
-        for chunkNum in range(chunks):
-            if self._timing is not None:
-                self._timing.start('Demod')
+        if levels is None:
+            if self._channelize:
+                demod = Channelizer(self._fs, frequencies)
+            else:
+                demod = Demod(self._fs, frequencies)
+            demod.demod(self._samples, demodulated)
+        else:
+            demod = Demod(self._fs, frequencies, sparse=False)
+            demod.select(levels, demodulated)
+
+        if signalNums is not None:
+            signals[signalNums, tailChunks:] = demodulated.T
+
+        if tailChunks:
+            if signalNums is None:
+                demod.select(self._tail, signals.T[:tailChunks])
+            else:
+                selected = numpy.empty((tailChunks, len(signalNums)),
+                                       dtype=dtype)
+                demod.select(self._tail, selected)
+                signals[signalNums, :tailChunks] = selected.T
 
-            chunkStart = chunkNum * DEMOD_BINS
-            chunk = self._samples[chunkStart:chunkStart + DEMOD_BINS]
+        if self._timing is not None:
+            self._timing.stop()
 
-            # Analyse chunk
-            fft = fftpack.fft(chunk, overwrite_x=True)
-            fft /= DEMOD_BINS
-            mags = numpy.absolute(fft)
-            bins = numpy.searchsorted(freqBins[freqInds],
-                                      self._frequencies)
-            levels = mags[freqInds][bins]
-            signals[chunkNum] = levels
+        # Smooth over the same time whatever the chunk size
+        boxLen = SMOOTH_LENGTH * DEMOD_BINS / chunkSize
+        self.__smooth(signals, boxLen, signalNums)
 
-            if self._timing is not None:
-                self._timing.stop()
+        return signals
 
-        signals = signals.T
-        self.__smooth(signals, 4)
+    # Search the signals of tracked collars with their pulse widths, and the
+    # signals outside tracked channels
+    # Other signals in a tracked channel are only searched if its collar
+    # is not found
+    def __search_tracked(self, baseband, levels, tracker):
+        start = time.time()
+        tracks = tracker.match(self._frequencies, baseband)
+        channels = set([track.freq for track in tracks.itervalues()])
+        signalNums = range(len(self._frequencies))
+
+        known = sorted(tracks)
+        new = [signalNum for signalNum in signalNums
+               if signalNum not in tracks and
+               self.__channel(signalNum, baseband) not in channels]
+        signals = self.__demod(levels, signalNums=sorted(known + new))
+
+        detected = self.__detect(signals, baseband, known, tracks)
+        found = set([collar.signalNum for collar in detected])
+        missed = [signalNum for signalNum in known if signalNum not in found]
+
+        channels = set([tracks[signalNum].freq for signalNum in missed])
+        covered = [signalNum for signalNum in signalNums
+                   if signalNum not in tracks and
+                   self.__channel(signalNum, baseband) in channels]
+        if covered:
+            signals = self.__demod(levels, signals, covered)
+
+        searched = sorted(new + missed + covered)
+        detected.extend(self.__detect(signals, baseband, searched))
+
+        demodulated = len(known) + len(new) + len(covered)
+        tracker.record(len(known), len(found),
+                       len(signalNums) - demodulated,
+                       demodulated, time.time() - start)
+
+        return signals, detected
 
-        return signals
+    def __remove_ghosts(self, signals, detected):
+        if len(detected) < 2:
+            return
 
-    def __correlate(self, a, v):
-        # Normalise
         if self._timing is not None:
             self._timing.start('Correl')
-        a = (a - numpy.mean(a)) / (numpy.std(a, dtype=numpy.float32) * len(a))
-        v = (v - numpy.mean(v)) / numpy.std(v, dtype=numpy.float32)
-        corr = numpy.correlate(a, v)
+        toRemove = find_ghosts(signals, detected)
         if self._timing is not None:
             self._timing.stop()
 
-        return corr[0] > (GHOST_CORR / 100.)
-
-    def __remove_ghosts(self, signals, detected):
-        if len(detected) < 2:
-            return
-
-        # Split into groups based on rate
-        rates = [collar.rate for collar in detected]
-        rates.sort()
-        df = numpy.diff(rates)
-        pos = numpy.where(df > GHOST_RATE_TOL)[0] + 1
-        groups = numpy.split(rates, pos)
-
-        # Try all combinations
-        toRemove = []
-        for group in groups:
-            collars = [collar for collar in detected
-                       if collar.rate in group]
-            collars.sort(key=operator.attrgetter('level'), reverse=True)
-            combinations = itertools.combinations(collars, 2)
-            for combo in combinations:
-                # Test if signals correlate
-                corr = self.__correlate(signals[combo[0].signalNum],
-                                        signals[combo[1].signalNum])
-                if corr:
-                    toRemove.append(combo[1])
-
-        toRemove = set(toRemove)
         for collar in toRemove:
             detected.remove(collar)
 
         if self._debug is not None and self._debug.verbose:
             print '\tRemoved {} ghosts'.format(len(toRemove))
 
-    def search(self, baseband):
+    # Search all signals, only tracked signals first if using a tracker, or
+    # for the collars expected from a watch for each signal
+    def search(self, baseband, levels=None, tracker=None, watches=None):
         if not len(self._frequencies):
             return []
-        signals = self.__demod()
-        detected = self.__detect(signals, baseband)
+        if watches is not None:
+            signals = self.__demod(levels)
+            detected = self.__detect(signals, baseband,
+                                     tracks=dict(enumerate(watches)))
+        elif tracker is None:
+            signals = self.__demod(levels)
+            detected = self.__detect(signals, baseband)
+        else:
+            signals, detected = self.__search_tracked(baseband, levels,
+                                                      tracker)
         self.__remove_ghosts(signals, detected)
 
         return detected
@@ -401,6 +814,10 @@ class Detect(object):
     def get_signals(self):
         return self._signals
 
+    # Signals searched, passing the level & edge tests, and collars found
+    def get_stages(self):
+        return tuple(self._stages)
+
 
 class DetectDebug(object):
     def __init__(self, edges, am, disableAm, verbose):
@@ -424,14 +841,33 @@ class DetectDebug(object):
             self._callbackAm(*args)
 
 
+# Lookup table of sample levels for each byte value
+def __iq_lut():
+    values = numpy.arange(256, dtype=numpy.float32).repeat(2)
+    lut = values.view(numpy.complex64)
+    lut /= 255 / 2
+    lut -= 1 + 1j
+
+    return lut.real.copy()
+
+
+IQ_LUT = __iq_lut()
+
+
+# Decode a stream of interleaved IQ bytes into out (complex64)
+def bytes_to_complex(stream, out):
+    bytes_np = numpy.frombuffer(stream, dtype=numpy.uint8)
+    numpy.take(IQ_LUT, bytes_np, out=out.view(numpy.float32), mode='clip')
+
+    return out
+
+
 # Convert IQ stream to complex
 def stream_to_complex(stream):
-    bytes_np = numpy.ctypeslib.as_array(stream)
-    iq = bytes_np.astype(numpy.float32).view(numpy.complex64)
-    iq /= 255 / 2
-    iq -= 1 + 1j
+    bytes_np = numpy.frombuffer(stream, dtype=numpy.uint8)
+    iq = numpy.empty(bytes_np.size / 2, dtype=numpy.complex64)
 
-    return iq
+    return bytes_to_complex(bytes_np, iq)
 
 
 if __name__ == '__main__':
@@ -22,6 +22,9 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import Queue
+import heapq
+import itertools
 import threading
 import time
 
@@ -31,15 +34,23 @@ SCAN_START, SCAN_DONE, \
     STATUS_IDLE, STATUS_WAIT, STATUS_CAPTURE, STATUS_PROCESS, \
     INFO, WARN, ERR = range(13)
 
+# Longest wait for an event before checking for cancellation (s)
+EVENT_TIMEOUT = 1
+
 
 class Event(object):
     def __init__(self, eventType, **kwargs):
         self._eventType = eventType
         self._args = kwargs
+        self._time = time.time()
 
     def get_type(self):
         return self._eventType
 
+    # Time the event was created
+    def get_time(self):
+        return self._time
+
     def get_arg(self, arg):
         if arg in self._args:
             return self._args[arg]
@@ -48,6 +59,125 @@ class Event(object):
         return self._args
 
 
+# Wait for the next event, None if there is none within timeout (s) or the
+# wait is interrupted
+def get_event(queue, timeout=EVENT_TIMEOUT):
+    try:
+        return queue.get(timeout=timeout)
+    except Queue.Empty:
+        return None
+    except IOError:
+        return None
+
+
+# An event waiting in the Scheduler
+class Timer(object):
+    def __init__(self, scheduler, queue, event):
+        self._scheduler = scheduler
+        self._queue = queue
+        self._event = event
+        self._due = None
+        self._pending = False
+
+    # Stop the event being posted, False if it has already been posted
+    def cancel(self):
+        return self._scheduler.cancel(self)
+
+    # Post the event after delay (s) instead, False if it has already
+    # been posted
+    def reschedule(self, delay):
+        return self._scheduler.reschedule(self, delay)
+
+
+# Posts delayed events in time order from a single thread
+# Timers are kept in a heap, cancelled and rescheduled entries are dropped
+# when they reach the top
+class Scheduler(threading.Thread):
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.name = 'Scheduler'
+        self.daemon = True
+
+        self._condition = threading.Condition()
+        self._heap = []
+        self._count = itertools.count()
+
+        self.start()
+
+    def __push(self, timer, delay):
+        timer._due = time.time() + delay
+        timer._pending = True
+        heapq.heappush(self._heap, (timer._due, next(self._count), timer))
+        self._condition.notify()
+
+    def run(self):
+        with self._condition:
+            while True:
+                now = time.time()
+                while self._heap and self._heap[0][0] <= now:
+                    due, _count, timer = heapq.heappop(self._heap)
+                    if timer._pending and timer._due == due:
+                        timer._pending = False
+                        timer._queue.put(timer._event)
+
+                if self._heap:
+                    self._condition.wait(self._heap[0][0] - now)
+                else:
+                    self._condition.wait()
+
+    # Post event to queue after delay (s)
+    def schedule(self, delay, queue, event):
+        timer = Timer(self, queue, event)
+        with self._condition:
+            self.__push(timer, delay)
+
+        return timer
+
+    def cancel(self, timer):
+        with self._condition:
+            pending = timer._pending
+            timer._pending = False
+
+        return pending
+
+    def reschedule(self, timer, delay):
+        with self._condition:
+            if not timer._pending:
+                return False
+            self.__push(timer, delay)
+
+        return True
+
+    # Cancel all the events waiting for queue, or every queue
+    def cancel_all(self, queue=None):
+        with self._condition:
+            heap = []
+            for entry in self._heap:
+                timer = entry[2]
+                if queue is None or timer._queue is queue:
+                    timer._pending = False
+                else:
+                    heap.append(entry)
+            heapq.heapify(heap)
+            self._heap = heap
+            self._condition.notify()
+
+
+_scheduler = None
+_schedulerLock = threading.Lock()
+
+
+# The Scheduler shared by all posts, started on first use
+def get_scheduler():
+    global _scheduler
+    with _schedulerLock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+
+    return _scheduler
+
+
+# Delayed posts return their Timer, others None
 class Post(object):
     def __init__(self, queue):
         self._queue = queue
@@ -55,9 +185,9 @@ class Post(object):
     def __post(self, event, delay=0):
         if delay == 0:
             self._queue.put(event)
-        else:
-            thread = threading.Timer(delay, self._queue.put, args=(event,))
-            thread.start()
+            return None
+
+        return get_scheduler().schedule(delay, self._queue, event)
 
     def status(self, eventType):
         if eventType >= STATUS_IDLE and eventType <= STATUS_PROCESS:
@@ -66,7 +196,7 @@ class Post(object):
 
     def scan_start(self, delay=0):
         event = Event(SCAN_START)
-        self.__post(event, delay)
+        return self.__post(event, delay)
 
     def scan_done(self, collars=None, timeStamp=None):
         event = Event(SCAN_DONE, collars=collars, time=timeStamp)
@@ -74,7 +204,7 @@ class Post(object):
 
     def gps_open(self, delay):
         event = Event(GPS_OPEN)
-        self.__post(event, delay)
+        return self.__post(event, delay)
 
     def gps_location(self, location):
         event = Event(GPS_LOC,
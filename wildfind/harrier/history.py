@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+#
+#
+# Wild Find
+#
+#
+# Copyright 2014 - 2017 Al Brown
+#
+# Wildlife tracking and mapping
+#
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import numpy
+
+from wildfind.harrier.ddc import Channelizer, DDC_DECIMATION
+from wildfind.harrier.demod import Demod, DEMOD_BINS
+from wildfind.harrier.detect import PULSE_MIN, PULSE_RATES
+
+
+# Time analysed, enough for PULSE_MIN pulses of the slowest rate (s)
+HISTORY_SPAN = PULSE_MIN * 60. / min(PULSE_RATES)
+
+
+# Levels of every bin at the end of recent contiguous captures, so signals
+# can be analysed across capture boundaries
+# Enough is kept to make up HISTORY_SPAN with a capture of duration (s)
+# Captures are contiguous if they start within tolerance (s) of the end of
+# the last one
+class History(object):
+    def __init__(self, fs, duration, tolerance, channelize=False):
+        self._fs = fs
+        self._tolerance = tolerance
+
+        bins = DEMOD_BINS
+        if channelize:
+            bins = DDC_DECIMATION
+        self._channelize = channelize
+        self._frequencies = numpy.fft.fftfreq(bins, 1. / fs)
+
+        chunks = max(0., HISTORY_SPAN - duration) * fs / bins
+        self._levels = numpy.empty((int(numpy.ceil(chunks)), bins),
+                                   dtype=numpy.float16)
+        self._filled = 0
+        self._baseband = None
+        self._end = None
+
+    # Most levels kept for each bin
+    def get_chunks(self):
+        return self._levels.shape[0]
+
+    # Memory used by the levels (bytes)
+    def get_size(self):
+        return self._levels.nbytes
+
+    def __is_contiguous(self, baseband, timeStamp):
+        return self._end is not None and baseband == self._baseband and \
+            abs(timeStamp - self._end) <= self._tolerance
+
+    # Levels of every bin at the end of the capture
+    def __demod(self, samples, chunks):
+        bins = self._levels.shape[1]
+        start = (samples.size / bins - chunks) * bins
+        if isinstance(samples, numpy.ndarray):
+            samples = samples[start:]
+        else:
+            samples = samples.get_tail(start)
+
+        if self._channelize:
+            demod = Channelizer(self._fs, self._frequencies, sparse=False)
+        else:
+            demod = Demod(self._fs, self._frequencies, sparse=False)
+        levels = numpy.empty((chunks, bins), dtype=numpy.float16)
+        demod.demod(samples, levels)
+
+        return levels
+
+    # Levels (chunks x bins) preceding a capture starting at timeStamp,
+    # None if it does not follow a contiguous capture
+    def get(self, baseband, timeStamp):
+        if not self._filled or not self.__is_contiguous(baseband, timeStamp):
+            return None
+
+        return self._levels[self._levels.shape[0] - self._filled:]
+
+    # Keep the end of a capture, from its samples or the levels of every bin
+    def update(self, baseband, timeStamp, duration, samples=None,
+               levels=None):
+        if not self.__is_contiguous(baseband, timeStamp):
+            self._filled = 0
+        self._baseband = baseband
+        self._end = timeStamp + duration
+
+        size = self._levels.shape[0]
+        if not size:
+            return
+
+        if levels is None:
+            chunks = min(size, samples.size / self._levels.shape[1])
+            levels = self.__demod(samples, chunks)
+        else:
+            levels = levels[-size:]
+
+        chunks = levels.shape[0]
+        self._levels[:size - chunks] = self._levels[chunks:]
+        self._levels[size - chunks:] = levels
+        self._filled = min(size, self._filled + chunks)
+
+
+if __name__ == '__main__':
+    print 'Please run harrier.py'
+    exit(1)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+#
+#
+# Wild Find
+#
+#
+# Copyright 2014 - 2017 Al Brown
+#
+# Wildlife tracking and mapping
+#
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import numpy
+
+
+# Minimum score of a matched pulse train (noise deviations)
+MATCH_SCORE = 6
+# Minimum number of pulses in a template
+MATCH_PULSES = 2
+
+
+# Pulse train templates (signals x samples) of widths and periods (samples)
+# Each covers all but the last period so every lag sees the same pulses
+def comb_templates(length, widths, periods):
+    positions = numpy.arange(length)
+    periods = numpy.asarray(periods, dtype=numpy.float64)[:, numpy.newaxis]
+    widths = numpy.asarray(widths, dtype=numpy.float64)[:, numpy.newaxis]
+
+    templates = numpy.fmod(positions, periods) < widths
+    templates &= positions < length - periods
+
+    return templates
+
+
+# Correlate each signal (signals x samples) with a pulse train of its width
+# and period (samples), as one batch of FFTs
+# Returns the score of the best lag of each, in robust deviations of the
+# correlation at other lags, with its start, mean pulse level and the
+# number of pulses in the capture
+def comb_correlate(signals, widths, periods):
+    length = signals.shape[1]
+    templates = comb_templates(length, widths, periods)
+    pulses = numpy.sum(templates, axis=1) / numpy.asarray(widths)
+
+    nfft = 1 << int(numpy.ceil(numpy.log2(2 * length)))
+    spectra = numpy.fft.rfft(signals.astype(numpy.float32), nfft, axis=1)
+    spectra *= numpy.conj(numpy.fft.rfft(templates, nfft, axis=1))
+    lags = int(numpy.ceil(numpy.max(periods)))
+    corr = numpy.fft.irfft(spectra, nfft, axis=1)[:, :lags]
+
+    # Only lags within one period
+    corr[numpy.arange(lags) >= numpy.asarray(periods)[:, numpy.newaxis]] = \
+        numpy.nan
+    corr /= numpy.sum(templates, axis=1)[:, numpy.newaxis]
+
+    starts = numpy.nanargmax(corr, axis=1)
+    peaks = corr[numpy.arange(corr.shape[0]), starts]
+    medians = numpy.nanmedian(corr, axis=1)
+    deviations = numpy.nanmedian(numpy.abs(corr - medians[:, numpy.newaxis]),
+                                 axis=1) * 1.4826
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        scores = (peaks - medians) / deviations
+    scores[~numpy.isfinite(scores)] = 0
+    scores[pulses < MATCH_PULSES] = 0
+
+    counts = numpy.ceil((length - starts) / numpy.asarray(periods))
+
+    return scores, starts, peaks, counts.astype(numpy.int)
+
+
+if __name__ == '__main__':
+    print 'Please run harrier.py'
+    exit(1)
@@ -26,6 +26,7 @@ from collections import OrderedDict
 import json
 
 from wildfind.harrier import events
+from wildfind.harrier.watchlist import create_watch
 
 
 class Parse(object):
@@ -46,13 +47,15 @@ class Parse(object):
     PORT = 'port'
     DELAY = 'delay'
     FREQUENCY = 'frequency'
+    WATCHLIST = 'watchlist'
 
     # Values
     VALUE = 'value'
-    FLOAT, STRING = range(2)
+    FLOAT, STRING, WATCHES = range(3)
 
     COMMANDS = [GET, SET, RUN]
-    METHODS = [SCAN, SCANS, SIGNALS, LOG, PORTS, SETTINGS, PORT, DELAY, FREQUENCY]
+    METHODS = [SCAN, SCANS, SIGNALS, LOG, PORTS, SETTINGS, PORT, DELAY, FREQUENCY,
+               WATCHLIST]
 
     def __init__(self, queue, status, database, settings, server):
         self._queue = queue
@@ -71,6 +74,8 @@ class Parse(object):
         self.__set(Parse.PORT, canSet=True, valSet=Parse.STRING)
         self.__set(Parse.DELAY, canSet=True, valSet=Parse.FLOAT)
         self.__set(Parse.FREQUENCY, canSet=True, valSet=Parse.FLOAT)
+        self.__set(Parse.WATCHLIST, canGet=True, canSet=True,
+                   valSet=Parse.WATCHES)
 
     def __set(self, method, canGet=False, canSet=False, canRun=False,
               valSet=None):
@@ -120,6 +125,16 @@ class Parse(object):
                 self._settings.freq = value
                 return self.result(method)
 
+        elif method == Parse.WATCHLIST:
+            if command == Parse.GET:
+                watchlist = [watch.get_list()
+                             for watch in self._settings.watchlist]
+                return self.result(method, watchlist)
+            elif command == Parse.SET:
+                self._settings.watchlist = [create_watch(*watch)
+                                            for watch in value]
+                return self.result(method)
+
     def __check_method(self, command, method, _value):
         canGet = self._params[method]['canGet']
         canSet = self._params[method]['canSet']
@@ -166,6 +181,18 @@ class Parse(object):
         elif valType == Parse.STRING:
             if value is None:
                 raise ValueException('Expected a string')
+        elif valType == Parse.WATCHES:
+            error = ('Expected a list of [frequency, rate, width] or '
+                     '[frequency, rate, width, modulation]')
+            if not isinstance(value, list):
+                raise ValueException(error)
+            for watch in value:
+                if not isinstance(watch, list) or len(watch) not in (3, 4):
+                    raise ValueException(error)
+                try:
+                    create_watch(*watch)
+                except (AttributeError, TypeError, ValueError):
+                    raise ValueException(error)
 
     def __get_params(self, instruction):
         command = instruction[Parse.COMMAND]
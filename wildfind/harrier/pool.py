@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+#
+#
+# Wild Find
+#
+#
+# Copyright 2014 - 2017 Al Brown
+#
+# Wildlife tracking and mapping
+#
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import ctypes
+import multiprocessing
+from multiprocessing import sharedctypes
+import operator
+import signal
+
+import numpy
+
+
+# Initial size of the shared signals buffer (bytes)
+POOL_BUFFER = 4 * 1024 * 1024
+
+# Shared signals buffer in each worker
+_shared = None
+
+
+def _init(shared):
+    global _shared
+    _shared = shared
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _view(shared, shape, dtype):
+    count = shape[0] * shape[1]
+    buf = numpy.ctypeslib.as_array(shared)
+    return buf[:count * numpy.dtype(dtype).itemsize].view(dtype).reshape(shape)
+
+
+def _detect(args):
+    from wildfind.harrier.detect import Detect
+
+    fs, frequencies, shape, dtype, signalNums, channelize = args
+    signals = _view(_shared, shape, dtype).T
+    detect = Detect(fs, None, frequencies, channelize=channelize)
+
+    return detect.analyse(signals, signalNums)
+
+
+# Pool of processes sharing the demodulated signals
+class DetectPool(object):
+    def __init__(self, workers):
+        self._workers = workers
+        self._pool = None
+        self._shared = None
+        self._dtype = None
+
+        self.__create(POOL_BUFFER)
+
+    def __create(self, size):
+        self.close()
+        self._shared = sharedctypes.RawArray(ctypes.c_ubyte, size)
+        self._pool = multiprocessing.Pool(self._workers,
+                                          _init, (self._shared,))
+
+    # Return a signals array (chunks x frequencies) in shared memory
+    def get_buffer(self, shape, dtype):
+        size = shape[0] * shape[1] * numpy.dtype(dtype).itemsize
+        if size > len(self._shared):
+            self.__create(max(size, 2 * len(self._shared)))
+
+        self._dtype = dtype
+        return _view(self._shared, shape, dtype)
+
+    # True if there are enough signals to split between workers
+    def is_useful(self, signals):
+        return signals > self._workers
+
+    # Find pulses in the shared buffer, returns the number of signals
+    # passing the edge test and a list of (signal number, pulse)
+    def detect(self, fs, frequencies, shape, signalNums=None,
+               channelize=False):
+        # Interleave signals to balance noisy parts of the spectrum
+        if signalNums is None:
+            signalNums = numpy.arange(shape[1])
+        else:
+            signalNums = numpy.asarray(signalNums)
+        tasks = [(fs, frequencies, shape, self._dtype,
+                  signalNums[i::self._workers], channelize)
+                 for i in range(self._workers)]
+
+        passed = 0
+        pulses = []
+        for result in self._pool.map(_detect, tasks):
+            passed += result[0]
+            pulses.extend(result[1])
+        pulses.sort(key=operator.itemgetter(0))
+
+        return passed, pulses
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+
+if __name__ == '__main__':
+    print 'Please run harrier.py'
+    exit(1)
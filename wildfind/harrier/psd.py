@@ -21,35 +21,258 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
-
 import numpy
+from numpy.lib.stride_tricks import as_strided
 from scipy import fftpack
 
 
-# A slightly optimised version of psd from http://matplotlib.org/
-def psd(samples, nfft, fs):
+# Gap between segments when no overlap is set (samples)
+PSD_GAP = 64 * 1024
+# Segments transformed in each batch
+PSD_BATCH = 32
+# Decimation of zoomed spectra
+ZOOM_DECIMATION = 32
+# FFT bins of zoomed spectra
+ZOOM_BINS = 1024
+# Segments averaged in zoomed spectra, spread across the samples
+ZOOM_AVERAGES = 8
+
+
+# Welch power spectral density
+# Based on psd from http://matplotlib.org/
+# Windows and frequency axes are cached between instances, segments are
+# transformed in batches and their power accumulated
+# Successive updates are treated as a continuous stream of samples
+class Psd(object):
+    _windows = {}
+    _freqs = {}
+
+    def __init__(self, nfft, fs, overlap=None, averages=None):
+        self._nfft = nfft
+        self._fs = fs
+        if overlap is None:
+            self._stride = nfft + PSD_GAP
+        else:
+            self._stride = max(1, int(nfft * (1 - overlap)))
+        self._averages = averages
+
+        if nfft not in Psd._windows:
+            Psd._windows[nfft] = numpy.hanning(nfft).astype(numpy.float32)
+        self._window = Psd._windows[nfft]
+
+        key = (nfft, fs)
+        if key not in Psd._freqs:
+            freqs = float(fs) / nfft * numpy.arange(nfft)
+            Psd._freqs[key] = numpy.concatenate((freqs[nfft / 2:] - fs,
+                                                 freqs[:nfft / 2]))
+        self._freqsShift = Psd._freqs[key]
+
+        self._power = numpy.zeros(nfft, numpy.float32)
+        self._count = 0
+        self._limit = None
+        self._step = self._stride
+        # Stream positions of the next segment and the next sample
+        self._next = 0
+        self._position = 0
+        # Samples of a segment started in the previous update
+        self._tail = numpy.empty(0, numpy.complex64)
+
+    def __accumulate(self, segments):
+        for start in range(0, len(segments), PSD_BATCH):
+            batch = segments[start:start + PSD_BATCH] * self._window
+            fft = fftpack.fft(batch, axis=1, overwrite_x=True)
+            power = numpy.square(fft.real)
+            power += numpy.square(fft.imag)
+            self._power += power.sum(axis=0)
+
+        self._count += len(segments)
+
+    # Start a new stream, a limited number of averages are spread
+    # across length samples
+    def reset(self, length=None):
+        self._power.fill(0)
+        self._count = 0
+        self._next = 0
+        self._position = 0
+        self._tail = numpy.empty(0, numpy.complex64)
+
+        self._step = self._stride
+        self._limit = None
+        if self._averages is not None and length is not None:
+            self._limit = self._averages
+            if self._averages > 1:
+                spread = (length - self._nfft) / (self._averages - 1)
+                self._step = max(self._stride, spread)
+
+    # Accumulate the power of the segments in the next samples of the stream
+    def update(self, samples):
+        samples = numpy.asarray(samples, dtype=numpy.complex64)
+        position = self._position
+        self._position += samples.size
+        if self.__is_full():
+            return
+
+        # Complete segments started in the previous update
+        if self._tail.size:
+            head = numpy.append(self._tail, samples[:self._nfft - 1])
+            starts = (self._tail.size - 1) / self._step + 1
+            count = self.__stride(head, 0, starts)
+            if count < starts:
+                self._tail = head[count * self._step:]
+                return
+            self._tail = numpy.empty(0, numpy.complex64)
+
+        offset = self._next - position
+        count = self.__stride(samples, offset)
+        offset += count * self._step
+
+        if offset < samples.size:
+            self._tail = samples[offset:].copy()
+
+    def __is_full(self):
+        return self._limit is not None and self._count >= self._limit
+
+    # Accumulate up to count segments from offset, returns the number used
+    def __stride(self, samples, offset, count=None):
+        nfft = self._nfft
+        fit = 0
+        if samples.size - offset >= nfft:
+            fit = (samples.size - offset - nfft) / self._step + 1
+        if count is not None:
+            fit = min(fit, count)
+        if self._limit is not None:
+            fit = max(0, min(fit, self._limit - self._count))
 
-    window = numpy.hanning(nfft).astype(numpy.float32)
+        if fit:
+            stride = samples.strides[0]
+            segments = as_strided(samples[offset:],
+                                  shape=(fit, nfft),
+                                  strides=(self._step * stride, stride))
+            self.__accumulate(segments)
+            self._next += fit * self._step
 
-    step = nfft + (64 * 1024)
-    indices = numpy.arange(0, len(samples) - nfft + 1, step)
-    length = len(indices)
-    levels = numpy.zeros((nfft, length), numpy.complex64)
+        return fit
 
-    for i in range(length):
-        chunk = samples[indices[i]:indices[i] + nfft]
-        chunk = window * chunk
-        fft = fftpack.fft(chunk, overwrite_x=True)
-        levels[:, i] = numpy.conj(fft[:nfft]) * fft[:nfft]
+    # Mean power of the accumulated segments
+    def get(self):
+        nfft = self._nfft
+        levels = numpy.empty(nfft, numpy.float32)
+        levels[:nfft - nfft / 2] = self._power[nfft / 2:]
+        levels[nfft - nfft / 2:] = self._power[:nfft / 2]
+        levels /= max(self._count, 1)
 
-    levels = levels.mean(axis=1)
-    levels = numpy.absolute(levels)
-    levels = numpy.concatenate((levels[nfft / 2:], levels[:nfft / 2]))
+        return self._freqsShift, levels
 
-    freqs = float(fs) / nfft * numpy.arange(nfft)
-    freqs = numpy.concatenate((freqs[nfft / 2:] - fs, freqs[:nfft / 2]))
+    # Number of segments accumulated
+    def get_count(self):
+        return self._count
 
-    return freqs, levels
+    # Spectrum of samples, or of consecutive windows of samples
+    def compute(self, samples):
+        self.reset(samples.size)
+        if isinstance(samples, numpy.ndarray):
+            self.update(samples)
+        else:
+            for window in samples:
+                self.update(window)
+
+        return self.get()
+
+
+# Zoomed power spectral density around frequencies
+# Each segment is mixed down to the centre of a region, decimated by
+# summing and transformed, nearby frequencies share a region
+class Zoom(object):
+    def __init__(self, fs, nfft=ZOOM_BINS, decimation=ZOOM_DECIMATION,
+                 averages=ZOOM_AVERAGES):
+        self._fs = fs
+        self._nfft = nfft
+        self._decimation = decimation
+        self._averages = averages
+        self._length = nfft * decimation
+        self._window = numpy.hanning(nfft).astype(numpy.float32)
+        fsZoom = float(fs) / decimation
+        self._freqs = numpy.fft.fftshift(numpy.fft.fftfreq(nfft, 1 / fsZoom))
+
+    # Centres of the regions containing each frequency, each frequency
+    # is within a quarter of the zoomed bandwidth of its centre
+    def __regions(self, frequencies):
+        span = self._fs / (4. * self._decimation)
+        centres = []
+        regions = []
+        for freq in frequencies:
+            if not centres or abs(freq - centres[-1]) > span:
+                centres.append(freq)
+            regions.append(len(centres) - 1)
+
+        return numpy.array(centres), regions
+
+    # Start of each segment, spread across the samples
+    def __starts(self, size):
+        count = (size - self._length) / self._length + 1
+        count = min(count, self._averages)
+        if count <= 0:
+            return []
+        if count == 1:
+            return [0]
+        step = (size - self._length) / (count - 1)
+        return [i * step for i in range(count)]
+
+    # Segments of samples, or of consecutive windows of samples
+    def __segments(self, samples):
+        starts = self.__starts(samples.size)
+        if isinstance(samples, numpy.ndarray):
+            for start in starts:
+                yield samples[start:start + self._length]
+            return
+
+        position = 0
+        for window in samples:
+            for start in starts:
+                offset = start - position
+                if offset >= 0 and offset + self._length <= window.size:
+                    yield window[offset:offset + self._length]
+            position += window.size
+
+    # Spectra (frequencies, levels) of the regions around sorted
+    # frequencies and the region of each, None if the samples are too short
+    def compute(self, samples, frequencies):
+        centres, regions = self.__regions(frequencies)
+
+        # Mixers split into the phase at the start of each decimated
+        # sample and the phase within it, summing the mixed samples
+        # becomes a matrix product
+        steps = numpy.arange(self._nfft) * self._decimation
+        steps = steps / float(self._fs)
+        offsets = numpy.arange(self._decimation) / float(self._fs)
+        mixSteps = numpy.exp(-2j * numpy.pi * numpy.outer(centres, steps))
+        mixSteps = mixSteps.astype(numpy.complex64)
+        mixSteps *= self._window
+        mixOffsets = numpy.exp(-2j * numpy.pi * numpy.outer(offsets, centres))
+        mixOffsets = mixOffsets.astype(numpy.complex64)
+
+        power = numpy.zeros((len(centres), self._nfft), numpy.float32)
+        count = 0
+        for segment in self.__segments(samples):
+            matrix = segment.reshape(self._nfft, self._decimation)
+            decimated = numpy.dot(matrix, mixOffsets).T * mixSteps
+            fft = fftpack.fft(decimated, axis=1, overwrite_x=True)
+            power += numpy.square(fft.real)
+            power += numpy.square(fft.imag)
+            count += 1
+
+        if not count:
+            return None
+        power /= count
+
+        freqs = numpy.add.outer(centres, self._freqs)
+        levels = numpy.fft.fftshift(power, axes=1)
+
+        return freqs, levels, regions
+
+
+def psd(samples, nfft, fs):
+    return Psd(nfft, fs).compute(samples)
 
 
 if __name__ == '__main__':
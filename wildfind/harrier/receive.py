@@ -22,16 +22,27 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import ctypes
+import Queue
 import threading
 import time
 
 import rtlsdr
 
 from wildfind.harrier import events
-from wildfind.harrier.constants import SAMPLE_RATE, SAMPLE_TIME, BLOCKS
-from wildfind.harrier.detect import Detect, stream_to_complex
-from wildfind.harrier.scan import Scan
+from wildfind.harrier.constants import SAMPLE_RATE, BLOCKS
+from wildfind.harrier.ddc import DDC_DECIMATION
+from wildfind.harrier.demod import DemodStream, DEMOD_BINS
+from wildfind.harrier.detect import Detect
+from wildfind.harrier.history import History
+from wildfind.harrier.pool import DetectPool
+from wildfind.harrier.psd import Psd, Zoom
+from wildfind.harrier.ring import CaptureRing
+from wildfind.harrier.scan import Scan, SCAN_BINS
+from wildfind.harrier.timing import Timing, get_peak_rss, reset_peak_rss
+from wildfind.harrier.tracker import Tracker
+from wildfind.harrier.window import Windows, window_size, \
+    WINDOW_CANDIDATES
+from wildfind.harrier.workspace import Workspace
 
 
 class Receive(threading.Thread):
@@ -45,12 +56,86 @@ class Receive(threading.Thread):
 
         self._cancel = False
         self._receive = False
+        # Wakes the thread to receive or stop
+        self._condition = threading.Condition()
 
         self._sdr = None
-        self._capture = (ctypes.c_ubyte * int(2 * SAMPLE_RATE * SAMPLE_TIME))()
+        self._reader = None
 
-        self._captureBlock = 0
-        self._timeStamp = None
+        # Whole USB transfers of 512 bytes
+        blockSize = int(2 * SAMPLE_RATE * settings.sampleTime / BLOCKS)
+        blockSize -= blockSize % 512
+        buffers = settings.recvBuffers if settings.continuous else 1
+        self._ring = CaptureRing(buffers, BLOCKS, blockSize,
+                                 settings.streaming, settings.memory is None)
+        self._blockSize = blockSize
+        self._blockSamples = blockSize / 2
+
+        samples = self._blockSamples * BLOCKS
+        # Actual capture time (s)
+        self._duration = samples / SAMPLE_RATE
+        chunkSize = DEMOD_BINS
+        if settings.detectChannelize:
+            chunkSize = DDC_DECIMATION
+
+        # Ends of contiguous captures, to search across their boundaries
+        self._history = None
+        if settings.continuous:
+            self._history = History(SAMPLE_RATE, self._duration,
+                                    self._duration / BLOCKS,
+                                    settings.detectChannelize)
+
+        # Process captures in windows within the memory ceiling
+        self._windows = None
+        self._timing = None
+        self._peaks = None
+        if settings.memory is not None:
+            reset_peak_rss()
+            reserved = get_peak_rss() + buffers * blockSize * BLOCKS
+            if self._history is not None:
+                reserved += self._history.get_size()
+            window = window_size(samples, settings.memory * 1024 ** 2,
+                                 reserved, chunkSize)
+            if window < DEMOD_BINS:
+                warning = 'Memory ceiling too low, using the smallest window'
+                events.Post(self._queue).warning(warning)
+                window = DEMOD_BINS
+            self._windows = Windows(samples, window)
+            self._timing = Timing(memory=True)
+            info = 'Processing in {:.0f}ms windows'
+            events.Post(self._queue).info(info.format(window * 1e3 /
+                                                      SAMPLE_RATE))
+
+        self._psd = Psd(SCAN_BINS, SAMPLE_RATE,
+                        settings.scanOverlap, settings.scanAverages)
+        self._zoom = None
+        if settings.scanZoom:
+            self._zoom = Zoom(SAMPLE_RATE)
+        self._demodStream = None
+        if settings.streaming:
+            self._demodStream = DemodStream(samples / DEMOD_BINS)
+
+        self._tracker = None
+        if settings.detectTrack:
+            self._tracker = Tracker()
+
+        self._pool = None
+        if settings.detectWorkers > 1:
+            self._pool = DetectPool(settings.detectWorkers)
+
+        # Buffers reused by each scan, sized for the most candidates
+        self._workspace = Workspace(self._timing)
+        if self._pool is None:
+            candidates = settings.scanCandidates
+            if candidates is None:
+                candidates = WINDOW_CANDIDATES
+            chunks = samples / chunkSize
+            if self._history is not None:
+                chunks += self._history.get_chunks()
+            self._workspace.reserve('signals', (chunks, candidates))
+        self._workspace.reserve('spectrum', (SCAN_BINS,))
+        self._stages = (0, 0, 0, 0)
+        self._scanCounts = (0, 0)
 
         devices = rtlsdr.librtlsdr.rtlsdr_get_device_count()
         if self._settings.recvIndex >= devices:
@@ -61,15 +146,48 @@ class Receive(threading.Thread):
             self.start()
 
     def __capture(self, data, _sdr):
-        length = len(data)
-        pos = self._captureBlock * length
-        dst = ctypes.byref(self._capture, pos)
-        ctypes.memmove(dst, data, length * ctypes.sizeof(ctypes.c_ubyte))
-
-        self._captureBlock += 1
-        if self._captureBlock == BLOCKS:
+        complete = self._ring.write(data)
+        if complete and not self._settings.continuous:
             self._sdr.cancel_read_async()
-            self._captureBlock = 0
+
+    def __open(self):
+        if self._sdr is None:
+            self._sdr = rtlsdr.RtlSdr(device_index=self._settings.recvIndex)
+            self._sdr.set_sample_rate(SAMPLE_RATE)
+            self._sdr.set_center_freq(self._settings.freq * 1e6)
+            time.sleep(1)
+            self._sdr.set_gain(self._settings.recvGain)
+            cal = int(self._settings.recvCal)
+            if cal != 0:
+                self._sdr.set_freq_correction(cal)
+
+    def __read(self):
+        try:
+            self._sdr.read_bytes_async(self.__capture,
+                                       self._blockSize)
+        except IOError as e:
+            error = 'Capture failed: {}'.format(e.message)
+            events.Post(self._queue).error(error)
+
+    # Capture into the ring on a separate thread, continuously or
+    # a single capture when streaming
+    def __stream(self):
+        if self._reader is not None:
+            return
+
+        events.Post(self._queue).status(events.STATUS_CAPTURE)
+        try:
+            self.__open()
+            if not self._settings.continuous:
+                self._ring.reset()
+        except IOError as e:
+            error = 'Capture failed: {}'.format(e.message)
+            events.Post(self._queue).error(error)
+            return
+
+        self._reader = threading.Thread(target=self.__read, name='Reader')
+        self._reader.daemon = True
+        self._reader.start()
 
     def __receive(self):
         self._receive = False
@@ -77,58 +195,190 @@ class Receive(threading.Thread):
         events.Post(self._queue).status(events.STATUS_CAPTURE)
 
         try:
-            if self._sdr is None:
-                self._sdr = rtlsdr.RtlSdr(device_index=self._settings.recvIndex)
-                self._sdr.set_sample_rate(SAMPLE_RATE)
-                self._sdr.set_center_freq(self._settings.freq * 1e6)
-                time.sleep(1)
-                self._sdr.set_gain(self._settings.recvGain)
-                cal = int(self._settings.recvCal)
-                if cal != 0:
-                    self._sdr.set_freq_correction(cal)
-            self._timeStamp = time.time()
-
+            self.__open()
+            self._ring.reset()
             self._sdr.read_bytes_async(self.__capture,
-                                       2 * SAMPLE_RATE * SAMPLE_TIME / BLOCKS)
+                                       self._blockSize)
             if self._cancel:
                 return
 
+            capture = self._ring.get()
+            self.__process(capture)
+
+        except Queue.Empty:
+            pass
+        except IOError as e:
+            error = 'Capture failed: {}'.format(e.message)
+            events.Post(self._queue).error(error)
+
+    # Process captures, or blocks when streaming, from the reader
+    def __poll(self):
+        alive = self._reader.is_alive()
+        try:
+            if self._settings.streaming:
+                capture, block = self._ring.get_block(0.1)
+                self.__process_block(capture, block)
+            else:
+                capture = self._ring.get(0.1)
+                self.__process(capture)
+        except Queue.Empty:
+            if not alive:
+                self._reader = None
+
+    # Analyse a block as it arrives, the capture is finished on the last block
+    def __process_block(self, capture, block):
+        if block == 0:
+            self._psd.reset(capture.iq.size)
+            self._demodStream.reset()
+
+        start = block * self._blockSamples
+        samples = capture.iq[start:start + self._blockSamples]
+        self._psd.update(samples)
+        self._demodStream.update(samples)
+
+        if block == BLOCKS - 1:
+            self.__process(capture, self._demodStream.get_levels())
+
+    # Search for signals and then for collars
+    def __search(self, iq, levels, baseband, timeStamp, tail):
+        pfa = self._settings.scanPfa
+        limit = self._settings.scanCandidates
+        if levels is None:
+            scan = Scan(SAMPLE_RATE, iq, self._timing, psd=self._psd,
+                        zoom=self._zoom, pfa=pfa, limit=limit,
+                        workspace=self._workspace)
+        else:
+            scan = Scan(SAMPLE_RATE, None, psd=self._psd, zoom=self._zoom,
+                        pfa=pfa, limit=limit, workspace=self._workspace)
+        frequencies = scan.search()
+        self._scanCounts = scan.get_counts()
+        if self._zoom is not None:
+            frequencies = scan.refine(iq)
+        if self._cancel:
+            return None
+
+        detect = Detect(SAMPLE_RATE, iq, frequencies, self._timing,
+                        pool=self._pool,
+                        channelize=self._settings.detectChannelize,
+                        workspace=self._workspace, storeSignals=False,
+                        match=self._settings.detectMatch, tail=tail)
+        collars = detect.search(baseband, levels, self._tracker)
+        self._stages = detect.get_stages()
+        if self._tracker is not None:
+            self._tracker.update(collars, frequencies, timeStamp)
+
+        return collars
+
+    # Search a capture, or the spectrum & levels accumulated while streaming
+    def __process(self, capture, levels=None):
+        try:
             events.Post(self._queue).status(events.STATUS_PROCESS)
-            iq = stream_to_complex(self._capture)
-            if self._cancel:
-                return
+            self._workspace.reset()
+            if self._timing is not None:
+                self._timing.reset_peaks()
+            iq = capture.iq
+            if iq is None:
+                self._windows.set_data(capture.data)
+                iq = self._windows
 
-            scan = Scan(SAMPLE_RATE, iq)
-            frequencies = scan.search()
-            if self._cancel:
-                return
+            baseband = self._settings.freq * 1e6
+            tail = None
+            if self._history is not None:
+                tail = self._history.get(baseband, capture.timeStamp)
 
-            detect = Detect(SAMPLE_RATE, iq, frequencies)
-            collars = detect.search(self._settings.freq * 1e6)
+            if self._settings.watch:
+                # Watched collars within the band
+                watches = [watch for watch in self._settings.watchlist
+                           if abs(watch.freq - baseband) < SAMPLE_RATE / 2]
+                frequencies = [watch.freq - baseband for watch in watches]
+                detect = Detect(SAMPLE_RATE, iq, frequencies, self._timing,
+                                channelize=self._settings.detectChannelize,
+                                workspace=self._workspace,
+                                storeSignals=False,
+                                match=self._settings.detectMatch,
+                                tail=tail)
+                collars = detect.search(baseband, levels, watches=watches)
+                self._stages = detect.get_stages()
+            else:
+                collars = self.__search(iq, levels, baseband,
+                                        capture.timeStamp, tail)
+                if collars is None:
+                    return
 
-            events.Post(self._queue).status(events.STATUS_IDLE)
-            events.Post(self._queue).scan_done(collars=collars,
-                                               timeStamp=self._timeStamp)
+            if self._history is not None:
+                self._history.update(baseband, capture.timeStamp,
+                                     self._duration, iq, levels)
 
-        except IOError as e:
-            error = 'Capture failed: {}'.format(e.message)
-            events.Post(self._queue).error(error)
+            if self._timing is not None:
+                self._peaks = self._timing.get_peaks()
+
+            if self._settings.continuous:
+                events.Post(self._queue).status(events.STATUS_CAPTURE)
+            else:
+                events.Post(self._queue).status(events.STATUS_IDLE)
+            events.Post(self._queue).scan_done(collars=collars,
+                                               timeStamp=capture.timeStamp)
+        finally:
+            self._ring.release(capture)
 
     def run(self):
         while not self._cancel:
-            if self._receive:
-                self.__receive()
+            if self._reader is not None:
+                self.__poll()
+                continue
+
+            with self._condition:
+                while not self._receive and not self._cancel:
+                    self._condition.wait()
+            if self._cancel:
+                break
+
+            if self._settings.continuous or self._settings.streaming:
+                self._receive = False
+                self.__stream()
             else:
-                try:
-                    time.sleep(0.1)
-                except IOError:
-                    pass
+                self.__receive()
 
     def receive(self):
-        self._receive = True
+        with self._condition:
+            self._receive = True
+            self._condition.notify()
+
+    # Captured & dropped buffers and the percentage of airtime processed
+    def get_stats(self):
+        return self._ring.get_stats()
+
+    # Peaks found in the spectrum and the candidates kept in the last scan
+    def get_scan_stats(self):
+        return self._scanCounts
+
+    # Signals searched, passing the level & edge tests, and collars found
+    # in the last scan
+    def get_detect_stats(self):
+        return self._stages
+
+    # Tracked collars searched, found & signals skipped in the last scan,
+    # and the estimated time saved (s), if tracking
+    def get_tracker_stats(self):
+        if self._tracker is None:
+            return None
+        return self._tracker.get_stats()
+
+    # Buffer allocations and bytes allocated in the last scan
+    def get_workspace_stats(self):
+        return self._workspace.get_stats()
+
+    # Peak resident memory of each stage (MB) in the last scan,
+    # if using a memory ceiling
+    def get_peaks(self):
+        return self._peaks
 
     def stop(self):
-        self._cancel = True
+        with self._condition:
+            self._cancel = True
+            self._condition.notify()
+        if self._pool is not None:
+            self._pool.close()
         if self._sdr is not None:
             try:
                 self._sdr.cancel_read_async()
@@ -23,7 +23,6 @@
 #
 
 import argparse
-import ctypes
 import os
 import re
 import sys
@@ -38,7 +37,7 @@ import rtlsdr
 from scipy.io import wavfile
 
 from wildfind.harrier.constants import SAMPLE_TIME, SAMPLE_RATE, BLOCKS
-from wildfind.harrier.detect import Detect, DetectDebug, DEMOD_BINS, stream_to_complex
+from wildfind.harrier.detect import Detect, DetectDebug, DEMOD_BINS, bytes_to_complex
 from wildfind.harrier.scan import Scan, SCAN_BINS
 from wildfind.harrier.timing import Timing
 from wildfind.harrier.utils import Utils
@@ -52,7 +51,7 @@ class ReceiveDebug(object):
     def __init__(self, argList=None):
         self._args = self.__parse_arguments(argList)
 
-        self._timing = Timing()
+        self._timing = Timing(memory=True)
 
         self.debug = DetectDebug(self._args.edges, self._args.am,
                                  self._args.disableAm, self._args.verbose)
@@ -162,6 +161,7 @@ class ReceiveDebug(object):
         if self._args.collars is not None:
             iq_copy = numpy.array(iq)
 
+        self._timing.reset_peaks()
         scan = Scan(self._source.fs, iq, self._timing)
         frequencies = scan.search()
         if self._args.scan:
@@ -467,7 +467,8 @@ class SourceRtlSdr(object):
         self.baseband = baseband
         self._callback = callback
 
-        self._capture = (ctypes.c_ubyte * int(2 * SAMPLE_RATE * SAMPLE_TIME))()
+        self._iq = numpy.empty(int(SAMPLE_RATE * SAMPLE_TIME),
+                               dtype=numpy.complex64)
         self._captureBlock = 0
 
         print 'RTLSDR:'
@@ -484,10 +485,9 @@ class SourceRtlSdr(object):
         time.sleep(1)
 
     def __capture(self, data, _sdr):
-        length = len(data)
+        length = len(data) / 2
         pos = self._captureBlock * length
-        dst = ctypes.byref(self._capture, pos)
-        ctypes.memmove(dst, data, length * ctypes.sizeof(ctypes.c_ubyte))
+        bytes_to_complex(data, self._iq[pos:pos + length])
 
         self._captureBlock += 1
         progress = 100.*self._captureBlock / BLOCKS
@@ -498,15 +498,12 @@ class SourceRtlSdr(object):
             self._sdr.cancel_read_async()
             self._captureBlock = 0
 
-    def start(self, timing):
+    def start(self, _timing=None):
         while True:
             print 'Capturing...'
             self._sdr.read_bytes_async(self.__capture,
                                        2 * SAMPLE_RATE * SAMPLE_TIME / BLOCKS)
-            timing.start('Convert')
-            iq = stream_to_complex(self._capture)
-            timing.stop()
-            self._callback(iq)
+            self._callback(self._iq)
 
 
 def main(argList=None):
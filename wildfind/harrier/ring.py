@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+#
+#
+# Wild Find
+#
+#
+# Copyright 2014 - 2017 Al Brown
+#
+# Wildlife tracking and mapping
+#
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import Queue
+import threading
+import time
+
+import numpy
+
+from wildfind.harrier.detect import bytes_to_complex
+
+
+# A single pre-allocated capture buffer of decoded IQ samples,
+# or of the IQ bytes if not decoded
+class Capture(object):
+    def __init__(self, size, decode=True):
+        self.iq = None
+        self.data = None
+        if decode:
+            self.iq = numpy.empty(size / 2, dtype=numpy.complex64)
+        else:
+            self.data = numpy.empty(size, dtype=numpy.uint8)
+        self.timeStamp = None
+
+
+# Ring of capture buffers
+# The receiver callback decodes blocks into one buffer while completed
+# buffers wait to be processed, if no buffer is free the capture is dropped
+# With notify each decoded block is queued rather than each completed buffer
+class CaptureRing(object):
+    def __init__(self, buffers, blocks, blockSize, notify=False, decode=True):
+        self._blocks = blocks
+        self._blockSize = blockSize
+        self._notify = notify
+
+        self._free = Queue.Queue()
+        self._full = Queue.Queue()
+        self._arrived = Queue.Queue()
+        for _i in range(buffers):
+            self._free.put(Capture(blocks * blockSize, decode))
+
+        self._lock = threading.Lock()
+        self._fill = None
+        self._block = 0
+        self._captured = 0
+        self._dropped = 0
+
+    # Write a block from the receiver, returns True when a capture completes
+    def write(self, data):
+        if self._block == 0:
+            try:
+                self._fill = self._free.get_nowait()
+                self._fill.timeStamp = time.time()
+            except Queue.Empty:
+                self._fill = None
+
+        length = min(len(data), self._blockSize)
+        if self._fill is not None:
+            block = numpy.frombuffer(data, numpy.uint8, length)
+            pos = self._block * self._blockSize
+            if self._fill.iq is None:
+                self._fill.data[pos:pos + length] = block
+            else:
+                iq = self._fill.iq[pos / 2:(pos + length) / 2]
+                bytes_to_complex(block, iq)
+            if self._notify:
+                self._arrived.put((self._fill, self._block))
+
+        self._block += 1
+        if self._block < self._blocks:
+            return False
+
+        self._block = 0
+        with self._lock:
+            if self._fill is None:
+                self._dropped += 1
+            else:
+                self._captured += 1
+                if not self._notify:
+                    self._full.put(self._fill)
+                self._fill = None
+
+        return True
+
+    # Discard a partially filled buffer
+    def reset(self):
+        if self._fill is not None:
+            self._free.put(self._fill)
+            self._fill = None
+        self._block = 0
+
+        while not self._arrived.empty():
+            self._arrived.get_nowait()
+
+    # Get the next completed capture, raises Queue.Empty on timeout
+    def get(self, timeout=None):
+        if timeout is None:
+            return self._full.get_nowait()
+        return self._full.get(timeout=timeout)
+
+    # Get the next decoded (capture, block), raises Queue.Empty on timeout
+    def get_block(self, timeout=None):
+        if timeout is None:
+            return self._arrived.get_nowait()
+        return self._arrived.get(timeout=timeout)
+
+    # Return a processed capture to the ring
+    def release(self, capture):
+        self._free.put(capture)
+
+    # Captured & dropped buffer counts and the percentage of airtime covered
+    def get_stats(self):
+        with self._lock:
+            captured = self._captured
+            dropped = self._dropped
+
+        total = captured + dropped
+        if total:
+            duty = captured * 100. / total
+        else:
+            duty = 100.
+
+        return captured, dropped, duty
+
+
+if __name__ == '__main__':
+    print 'Please run harrier.py'
+    exit(1)
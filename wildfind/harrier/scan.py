@@ -23,8 +23,9 @@
 #
 
 import numpy
+from scipy import special
 
-from wildfind.harrier.psd import psd
+from wildfind.harrier.psd import Psd
 from wildfind.harrier.utils import Utils
 
 
@@ -32,75 +33,323 @@ from wildfind.harrier.utils import Utils
 SCAN_BINS = 4096
 # Peak level change (dB)
 SCAN_CHANGE = 2.
+# Bins in each chunk of the spectra searched in step for peaks
+SCAN_CHUNK = 32
+# Training bins either side of each bin used to estimate the noise floor
+SCAN_CFAR_TRAIN = 32
+# Guard bins between each bin and its training bins
+SCAN_CFAR_GUARD = 4
+
+
+# Search the columns (chunks) of levels in step, each as if from the start
+# of a spectrum, where changes are 1 for a peak and -1 for a trough
+# The state is the direction, the highest level in that direction and the
+# index of the last peak, with levels negated when looking for a trough
+def __search_chunks(levels, delta):
+    size, lanes = levels.shape
+    sign = numpy.ones(lanes, dtype=levels.dtype)
+    highest = numpy.full(lanes, -numpy.inf, dtype=levels.dtype)
+    index = numpy.zeros(lanes, dtype=numpy.int)
+    changes = numpy.empty((size, lanes), dtype=numpy.int8)
+    peaks = numpy.empty((size, lanes), dtype=numpy.int)
+
+    for i in range(size):
+        level = levels[i] * sign
+        higher = level > highest
+        highest = numpy.fmax(highest, level)
+        index[higher] = i
+        change = level <= highest - delta
+        numpy.multiply(change, sign, out=changes[i], casting='unsafe')
+        peaks[i] = index
+        sign[change] *= -1
+        highest = numpy.where(change, -level, highest)
+        index[change] = i
+
+    return [sign, highest, index], changes, peaks
+
+
+# Chunks (lanes) which started from another state than their previous
+# chunks (prevs) ended in, the index only matters when looking for a peak
+def __restarted(exits, entries, prevs, lanes):
+    sign, highest, index = exits
+    entrySign, entryHighest, entryIndex = entries
+
+    return ((sign[prevs] != entrySign[lanes]) |
+            (highest[prevs] != entryHighest[lanes]) |
+            ((sign[prevs] > 0) & (index[prevs] != entryIndex[lanes])))
+
+
+# Search the chunks (lanes) again from the state their previous chunks ended
+# in, jumping between changes until they rejoin the earlier search
+# Searches follow on to the next chunk if it started from another state,
+# unless it has already been searched again
+def __follow_chunks(levels, starts, follows, delta, exits, entries, changes,
+                    peaks, lanes):
+    size = levels.shape[0]
+    rows = numpy.arange(size)[:, numpy.newaxis]
+    sign, highest, index = exits
+    entrySign, entryHighest, entryIndex = entries
+
+    claimed = numpy.zeros(follows.size, dtype=numpy.bool)
+    claimed[lanes] = True
+    s = entrySign[lanes] = sign[lanes - 1]
+    h = entryHighest[lanes] = highest[lanes - 1]
+    ix = entryIndex[lanes] = index[lanes - 1]
+    first = numpy.zeros(lanes.size, dtype=numpy.int)
+
+    while lanes.size:
+        cols = numpy.arange(lanes.size)
+        resumed = first.any()
+
+        # Next change, and the peak up to it
+        z = levels[:, lanes] * s
+        if resumed:
+            z[rows < first] = numpy.nan
+        rising = numpy.fmax.accumulate(z, axis=0)
+        top = numpy.fmax(rising, h)
+        trigger = z <= top - delta
+        at = trigger.argmax(axis=0)
+        found = trigger[at, cols]
+        at[~found] = size - 1
+        best = rising[at, cols]
+        idx = numpy.where(best > h,
+                          starts[lanes] + (z == best).argmax(axis=0), ix)
+
+        # Clear earlier changes before it
+        clear = rows < at + ~found
+        if resumed:
+            clear &= rows >= first
+        changes[:, lanes] *= ~clear
+
+        # Stop if the earlier search changed there too
+        kind = s[found]
+        changeLanes = lanes[found]
+        changeAt = at[found]
+        same = numpy.zeros(lanes.size, dtype=numpy.bool)
+        same[found] = changes[changeAt, changeLanes] == kind
+        changes[changeAt, changeLanes] = kind
+        peaks[changeAt, changeLanes] = idx[found] - starts[changeLanes]
+
+        s = numpy.where(found, -s, s)
+        h = numpy.where(found, -z[at, cols], top[-1])
+        ix = numpy.where(found, starts[lanes] + at, idx)
+        first = at + 1
+
+        ended = ~same & (~found | (first == size))
+        endLanes = lanes[ended]
+        sign[endLanes] = s[ended]
+        highest[endLanes] = h[ended]
+        index[endLanes] = ix[ended]
+
+        # Follow on to the next chunks
+        finished = ended | same
+        prevs = lanes[finished]
+        nexts = prevs + 1
+        going = follows[nexts] & ~claimed[nexts]
+        prevs = prevs[going]
+        nexts = nexts[going]
+        going = __restarted(exits, entries, prevs, nexts)
+        prevs = prevs[going]
+        nexts = nexts[going]
+        claimed[nexts] = True
+        entrySign[nexts] = sign[prevs]
+        entryHighest[nexts] = highest[prevs]
+        entryIndex[nexts] = index[prevs]
+
+        going = ~finished
+        lanes = numpy.concatenate((lanes[going], nexts))
+        s = numpy.concatenate((s[going], sign[prevs]))
+        h = numpy.concatenate((h[going], highest[prevs]))
+        ix = numpy.concatenate((ix[going], index[prevs]))
+        first = numpy.concatenate((first[going],
+                                   numpy.zeros(nexts.size, dtype=numpy.int)))
+
+
+# Find peaks in a batch of spectra, returns the peak indices of each
+# A peak must rise and fall by delta from the lowest level either side of it
+# The spectra are split into chunks which are all searched in step, then
+# chunks which started from the wrong state are searched again from the
+# state the chunk before ended in, until every chunk agrees
+def find_peaks(spectra, delta=SCAN_CHANGE, chunk=SCAN_CHUNK):
+    spectra = numpy.atleast_2d(spectra)
+    delta = spectra.dtype.type(delta)
+    batch, size = spectra.shape
+    chunks = -(-size // chunk)
+
+    # Chunks as columns, padded with levels which never change the search
+    levels = numpy.full((batch, chunks * chunk), numpy.nan,
+                        dtype=spectra.dtype)
+    levels[:, :size] = spectra
+    levels = levels.reshape(-1, chunk).T.copy()
+    lanes = levels.shape[1]
+    starts = numpy.arange(lanes) % chunks * chunk
+    follows = numpy.zeros(lanes + 1, dtype=numpy.bool)
+    follows[:lanes] = starts > 0
+
+    with numpy.errstate(invalid='ignore'):
+        exits, changes, peaks = __search_chunks(levels, delta)
+        exits[2] += starts
+        entries = [numpy.ones(lanes, dtype=spectra.dtype),
+                   numpy.full(lanes, -numpy.inf, dtype=spectra.dtype),
+                   starts.copy()]
+
+        restarted = follows[:lanes].copy()
+        while restarted.any():
+            __follow_chunks(levels, starts, follows, delta, exits, entries,
+                            changes, peaks, numpy.flatnonzero(restarted))
+            restarted[1:] = __restarted(exits, entries,
+                                        numpy.arange(lanes - 1),
+                                        numpy.arange(1, lanes))
+            restarted &= follows[:lanes]
+            # Search again from the first wrong chunk of each run
+            restarted[1:] &= ~restarted[:-1]
+
+    falls = changes.T.reshape(batch, -1) > 0
+    peaks = (peaks + starts).T.reshape(batch, -1)[falls]
+    counts = falls.sum(axis=1)
+
+    return numpy.split(peaks, numpy.cumsum(counts)[:-1])
+
+
+# Noise floor of each bin, the mean level of the training bins either side
+# Returns the floor and the number of training bins of each
+def noise_floor(levels, train=SCAN_CFAR_TRAIN, guard=SCAN_CFAR_GUARD):
+    size = levels.size
+    sums = numpy.zeros(size + 1)
+    numpy.cumsum(levels, out=sums[1:])
+
+    indices = numpy.arange(size)
+    lowStart = numpy.clip(indices - guard - train, 0, size)
+    lowEnd = numpy.clip(indices - guard, 0, size)
+    highStart = numpy.clip(indices + guard + 1, 0, size)
+    highEnd = numpy.clip(indices + guard + train + 1, 0, size)
+
+    total = sums[lowEnd] - sums[lowStart] + sums[highEnd] - sums[highStart]
+    counts = lowEnd - lowStart + highEnd - highStart
+
+    return total / counts, counts
+
+
+# Cell averaging CFAR, peaks above the threshold for a probability of
+# false alarm (pfa) over the noise floor
+# Levels averaged from segments follow an F distribution relative to the
+# floor, which reduces to the usual CA-CFAR threshold for one segment
+# Returns the peaks and their signal to noise ratios
+def cfar_peaks(levels, peaks, pfa, averages=1):
+    floor, counts = noise_floor(levels)
+    floor = floor[peaks]
+    counts = counts[peaks]
+    scale = special.fdtri(2 * averages, 2 * averages * counts, 1 - pfa)
+
+    snr = levels[peaks] / floor
+    detected = snr > scale
+
+    return peaks[detected], snr[detected]
 
 
 # Search for possible signals
 # Filtered to SCAN_BINS
 # Peak must differ by SCAN_CHANGE from one of it's neighbouring bins
+# Peaks can be limited to those found by CFAR with a false alarm
+# probability of pfa, and to the limit with the highest SNR
+# Peaks can then be refined with zoomed spectra
+# The spectrum is kept in workspace if given, until the next scan
 class Scan(object):
-    def __init__(self, fs, samples, timing=None):
+    def __init__(self, fs, samples, timing=None, psd=None, zoom=None,
+                 pfa=None, limit=None, workspace=None):
         self._fs = fs
         self._samples = samples
         self._timing = timing
+        self._workspace = workspace
+        if psd is None:
+            psd = Psd(SCAN_BINS, fs)
+        self._psd = psd
+        self._zoom = zoom
+        self._pfa = pfa
+        self._limit = limit
+        self._counts = (0, 0)
+        self._found = None
         self._freqs = None
         self._levels = None
         self._peaks = None
 
-    # Based on https://gist.github.com/endolith/250860
-    def __peak_detect(self, spectrum):
-        freqIndices = []
-
-        indexPeak = 0
-        levelMin = numpy.array(numpy.Inf, dtype=numpy.float32)
-        levelMax = numpy.array(-numpy.Inf, dtype=numpy.float32)
-        delta = numpy.array(SCAN_CHANGE, dtype=numpy.float32)
-
-        findPeak = True
-        for i in range(spectrum.size):
-            level = spectrum[i]
-
-            if level > levelMax:
-                levelMax = level
-                indexPeak = i
-            if level < levelMin:
-                levelMin = level
-
-            if findPeak:
-                if level <= levelMax - delta:
-                    freqIndices.append(indexPeak)
-                    levelMin = level
-                    findPeak = False
-            else:
-                if level >= levelMin + delta:
-                    levelMax = level
-                    indexPeak = i
-                    findPeak = True
-
-        return freqIndices
-
+    # Search the samples, or the spectrum accumulated by psd if none
     def search(self):
-        if self._samples.size < SCAN_BINS:
+        if self._samples is not None and self._samples.size < SCAN_BINS:
             Utils.error('Sample too short')
 
         if self._timing is not None:
+            self._timing.stage('Scan')
             self._timing.start('Scan')
 
-        f, l = psd(self._samples, SCAN_BINS, self._fs)
+        if self._samples is None:
+            f, l = self._psd.get()
+        else:
+            f, l = self._psd.compute(self._samples)
+
+        if self._workspace is None:
+            decibels = numpy.empty(l.shape, dtype=l.dtype)
+        else:
+            decibels = self._workspace.get('spectrum', l.shape, l.dtype)
+        numpy.log10(l, out=decibels)
+        decibels *= 10
 
-        decibels = 10 * numpy.log10(l)
+        freqIndices = find_peaks(decibels)[0]
+        peaks = len(freqIndices)
 
-        freqIndices = self.__peak_detect(decibels)
+        # Rank by SNR when limiting
+        if self._pfa is not None:
+            freqIndices, snr = cfar_peaks(l, freqIndices, self._pfa,
+                                          max(1, self._psd.get_count()))
+        elif self._limit is not None:
+            snr = l[freqIndices] / noise_floor(l)[0][freqIndices]
+        if self._limit is not None and len(freqIndices) > self._limit:
+            ranked = numpy.argsort(snr)[::-1][:self._limit]
+            freqIndices = numpy.sort(freqIndices[ranked])
+
+        self._counts = (peaks, len(freqIndices))
 
         self._freqs = f
         self._levels = decibels
         self._peaks = decibels[freqIndices]
         freqs = f[freqIndices]
+        self._found = freqs
 
         if self._timing is not None:
             self._timing.stop()
 
         return freqs
 
+    # Refine the frequencies of the search with zoomed spectra of samples
+    # The peak of the zoomed spectrum within half a bin of each is used
+    def refine(self, samples):
+        if self._zoom is None or not len(self._found):
+            return self._found
+
+        if self._timing is not None:
+            self._timing.start('Zoom')
+
+        freqs = self._found
+        zoomed = self._zoom.compute(samples, freqs)
+        if zoomed is not None:
+            freqs = freqs.copy()
+            zoomFreqs, zoomLevels, regions = zoomed
+            width = self._fs / (2. * SCAN_BINS)
+            for i, region in enumerate(regions):
+                near = numpy.flatnonzero(abs(zoomFreqs[region] - freqs[i]) <=
+                                         width)
+                peak = near[numpy.argmax(zoomLevels[region][near])]
+                freqs[i] = zoomFreqs[region][peak]
+
+        if self._timing is not None:
+            self._timing.stop()
+
+        return freqs
+
+    # Peaks found and the candidates kept
+    def get_counts(self):
+        return self._counts
+
     def get_spectrum(self):
         return self._freqs, self._levels
 
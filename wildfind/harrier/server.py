@@ -108,6 +108,7 @@ class Server(threading.Thread):
                         self._client = client
                         result = self._parse.result_connect(VERSION)
                         self.send(result)
+                        self.send_status(True)
 
                         host = self.__get_client_name(client)
                         info = 'Connection from \'{}\''.format(host)
@@ -140,9 +141,13 @@ class Server(threading.Thread):
         sigs = self._parse.result_signals(resp)
         self.send(sigs)
 
-    def send_status(self):
-        status = self._parse.result('Status', self._status.get())
-        self.send(status)
+    # Send the status if it has changed, or always if forced
+    def send_status(self, force=False):
+        if self._client is None:
+            return
+        if force or self._status.is_changed():
+            status = self._parse.result('Status', self._status.get())
+            self.send(status)
 
     def send_sats(self):
         sats = self._parse.result('Satellites', self._status.get_satellites())
@@ -26,14 +26,28 @@ import ConfigParser
 import sys
 
 from wildfind.harrier.comm import Comm
+from wildfind.harrier.constants import SAMPLE_TIME, DB_FLUSH
+from wildfind.harrier.watchlist import create_watch
 
 
 class Settings(object):
     def __init__(self, args):
 
         self.db = args.file
+        self.dbFlush = DB_FLUSH
 
         self.delay = None
+        self.continuous = False
+        self.streaming = False
+        self.sampleTime = SAMPLE_TIME
+        self.scanOverlap = None
+        self.scanAverages = None
+        self.scanZoom = False
+        self.scanPfa = None
+        self.scanCandidates = None
+        self.memory = None
+        self.watch = False
+        self.watchlist = []
 
         self.survey = args.survey
         self.freq = args.frequency
@@ -42,6 +56,12 @@ class Settings(object):
         self.recvIndex = 0
         self.recvGain = 0
         self.recvCal = 0
+        self.recvBuffers = 2
+
+        self.detectWorkers = 1
+        self.detectTrack = False
+        self.detectChannelize = False
+        self.detectMatch = False
 
         self.gps = Comm()
 
@@ -57,6 +77,72 @@ class Settings(object):
             if config.has_option('scan', 'delay'):
                 self.delay = config.getint('scan', 'delay')
 
+            if config.has_option('scan', 'continuous'):
+                self.continuous = config.getboolean('scan', 'continuous')
+
+            if config.has_option('scan', 'streaming'):
+                self.streaming = config.getboolean('scan', 'streaming')
+
+            if config.has_option('scan', 'time'):
+                sampleTime = config.getfloat('scan', 'time')
+                if sampleTime >= 1:
+                    self.sampleTime = sampleTime
+                else:
+                    raise ValueError('Capture time must be at least 1s')
+
+            if config.has_option('scan', 'overlap'):
+                overlap = config.getfloat('scan', 'overlap')
+                if 0 <= overlap < 1:
+                    self.scanOverlap = overlap
+                else:
+                    raise ValueError('Overlap must be from 0 to less than 1')
+
+            if config.has_option('scan', 'averages'):
+                averages = config.getint('scan', 'averages')
+                if averages >= 1:
+                    self.scanAverages = averages
+                else:
+                    raise ValueError('Averages must be at least 1')
+
+            if config.has_option('scan', 'zoom'):
+                self.scanZoom = config.getboolean('scan', 'zoom')
+
+            if config.has_option('scan', 'pfa'):
+                pfa = config.getfloat('scan', 'pfa')
+                if 0 < pfa < 1:
+                    self.scanPfa = pfa
+                else:
+                    raise ValueError('False alarm probability must be '
+                                     'between 0 and 1')
+
+            if config.has_option('scan', 'candidates'):
+                candidates = config.getint('scan', 'candidates')
+                if candidates >= 1:
+                    self.scanCandidates = candidates
+                else:
+                    raise ValueError('Candidates must be at least 1')
+
+            if config.has_option('scan', 'watchlist'):
+                self.watch = config.getboolean('scan', 'watchlist')
+
+            if config.has_section('watchlist'):
+                for freq, values in config.items('watchlist'):
+                    values = values.split(',')
+                    if len(values) not in [2, 3]:
+                        error = ('Watch "{}" expects a rate, width and '
+                                 'optional modulation')
+                        raise ValueError(error.format(freq))
+                    self.watchlist.append(create_watch(freq, *values))
+
+            if config.has_option('scan', 'memory'):
+                memory = config.getint('scan', 'memory')
+                if memory < 1:
+                    raise ValueError('Memory must be at least 1MB')
+                elif self.streaming:
+                    raise ValueError('Memory cannot be set when streaming')
+                else:
+                    self.memory = memory
+
             if config.has_option('receiver', 'index'):
                 self.recvIndex = config.getint('receiver', 'index')
 
@@ -68,6 +154,40 @@ class Settings(object):
             if config.has_option('receiver', 'calibration'):
                 self.recvCal = config.getfloat('receiver', 'calibration')
 
+            if config.has_option('receiver', 'buffers'):
+                buffers = config.getint('receiver', 'buffers')
+                if buffers >= 2:
+                    self.recvBuffers = buffers
+                else:
+                    raise ValueError('Buffers must be at least 2')
+
+            if config.has_option('detect', 'workers'):
+                workers = config.getint('detect', 'workers')
+                if workers >= 1:
+                    self.detectWorkers = workers
+                else:
+                    raise ValueError('Workers must be at least 1')
+
+            if config.has_option('detect', 'track'):
+                self.detectTrack = config.getboolean('detect', 'track')
+
+            if config.has_option('detect', 'channelize'):
+                channelize = config.getboolean('detect', 'channelize')
+                if channelize and self.streaming:
+                    raise ValueError('Channelize cannot be set when '
+                                     'streaming')
+                self.detectChannelize = channelize
+
+            if config.has_option('detect', 'match'):
+                self.detectMatch = config.getboolean('detect', 'match')
+
+            if config.has_option('database', 'flush'):
+                flush = config.getfloat('database', 'flush')
+                if flush >= 0:
+                    self.dbFlush = flush
+                else:
+                    raise ValueError('Flush interval must be at least 0')
+
             self.gps.port = config.get('gps', 'port')
 
             if config.has_option('gps', 'baud'):
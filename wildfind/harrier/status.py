@@ -24,12 +24,19 @@
 
 from collections import OrderedDict
 import sys
+import threading
 import time
 
 from wildfind.common.constants import HARRIER_STATUS
 from wildfind.harrier import events
 
 
+# Interval between disk usage updates (s)
+STATUS_DISK_INTERVAL = 5
+
+
+# The disk usage is updated in the background, the status is changed
+# until it is next read
 class Status(object):
     _status = events.STATUS_IDLE
     _signals = 0
@@ -39,6 +46,26 @@ class Status(object):
     def __init__(self, database):
         self._database = database
 
+        self._disk = (0, 0)
+        self._changed = True
+
+        thread = threading.Thread(target=self.__monitor, name='Disk')
+        thread.daemon = True
+        thread.start()
+
+    # Update the database size and free space
+    def __monitor(self):
+        while True:
+            try:
+                disk = self._database.get_size()
+                if disk != self._disk:
+                    self._disk = disk
+                    self._changed = True
+            except OSError:
+                pass
+
+            time.sleep(STATUS_DISK_INTERVAL)
+
     def __display(self):
         lon = '        --'
         lat = '        --'
@@ -64,13 +91,16 @@ class Status(object):
         sys.stdout.flush()
 
     def set_status(self, status):
+        self._changed |= status != self._status
         self._status = status
         self.__display()
 
     def set_signals(self, signals):
+        self._changed |= signals != self._signals
         self._signals = signals
 
     def set_location(self, location):
+        self._changed |= location != self._location
         self._location = location
         self.__display()
 
@@ -79,9 +109,14 @@ class Status(object):
         self.__display()
 
     def clear_gps(self):
+        self._changed |= self._location is not None
         self._location = None
         self._sats = []
 
+    # True if the status has changed since it was last read
+    def is_changed(self):
+        return self._changed
+
     def get_wait(self):
         if self._status == events.STATUS_CAPTURE:
             return 'capture'
@@ -103,7 +138,8 @@ class Status(object):
             lat = self._location[0][1]
             fix = self._location[1]
 
-        size, space = self._database.get_size()
+        self._changed = False
+        size, space = self._disk
 
         resp = OrderedDict()
         resp['status'] = self._status - events.STATUS_IDLE
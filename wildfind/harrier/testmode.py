@@ -26,7 +26,6 @@ import Queue
 from math import log10
 import signal
 import sys
-import time
 
 from wildfind.harrier import events
 from wildfind.harrier.collar import MOD_DESC
@@ -45,13 +44,13 @@ class TestMode(object):
         events.Post(queue).scan_start()
 
         while self._receive.isAlive():
-            if not queue.empty():
-                self.__process_queue(settings, queue)
+            event = events.get_event(queue)
+            if event is not None:
+                self.__process_event(settings, queue, event)
 
         self.__close()
 
-    def __process_queue(self, _settings, queue):
-        event = queue.get()
+    def __process_event(self, _settings, queue, event):
         eventType = event.get_type()
 
         if eventType == events.SCAN_START:
@@ -88,11 +87,6 @@ class TestMode(object):
             self.__close()
             exit(3)
 
-        try:
-            time.sleep(0.1)
-        except IOError:
-            pass
-
     def __close(self, _signal=None, _frame=None):
         signal.signal(signal.SIGINT, self._signal)
         print '\nExiting\n'
@@ -23,19 +23,49 @@
 #
 
 from collections import OrderedDict
+import resource
 import time
 
 
-# Basic timing
+# Reset the peak resident memory of the process, where supported
+def reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as clearRefs:
+            clearRefs.write('5')
+    except IOError:
+        pass
+
+
+# Peak resident memory of the process (bytes)
+def get_peak_rss():
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except IOError:
+        pass
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# Basic timing and the buffers allocated by each routine
+# With memory, also the peak resident memory of each stage of a scan
+# Stages run one after another, so the peak of the process is reset as
+# each starts
 class Timing(object):
-    _name = None
-    _timings = OrderedDict()
-    _paused = None
+    def __init__(self, memory=False):
+        self._memory = memory
+        self._name = None
+        self._paused = None
+        self._timings = OrderedDict()
+        self._stage = None
+        self._peaks = OrderedDict()
 
     def start(self, name):
         self._name = name
         if name not in self._timings:
-            self._timings[name] = [0.] * 3
+            self._timings[name] = [0.] * 5
 
         self._timings[name][0] = time.clock()
 
@@ -51,6 +81,45 @@ class Timing(object):
         self._timings[self._name][1] += elapsed
         self._timings[self._name][2] += 1
 
+    def __end_stage(self):
+        if self._stage is not None:
+            peak = max(self._peaks.get(self._stage, 0), get_peak_rss())
+            self._peaks[self._stage] = peak
+            self._stage = None
+
+    # Start a stage of the scan, ending the last one
+    def stage(self, name):
+        if not self._memory:
+            return
+
+        self.__end_stage()
+        reset_peak_rss()
+        self._stage = name
+
+    # Clear the peaks at the start of a scan
+    def reset_peaks(self):
+        self._stage = None
+        self._peaks = OrderedDict()
+
+    # Record a buffer allocated (bytes) by the current routine
+    def allocated(self, size):
+        if self._name is not None:
+            self._timings[self._name][3] += 1
+            self._timings[self._name][4] += size
+
+    # Peak resident memory of each stage of the scan (MB), ending the
+    # current stage
+    def get_peaks(self):
+        self.__end_stage()
+        return OrderedDict((name, peak / 1024. ** 2)
+                           for name, peak in self._peaks.iteritems())
+
+    # Allocations and bytes allocated by each routine
+    def get_allocs(self):
+        return OrderedDict((name, (int(timing[3]), int(timing[4])))
+                           for name, timing in self._timings.iteritems()
+                           if timing[3] != 0)
+
     def print_timings(self):
         formatTimings = '\t{:<8} {:>6d} {:>10.3f} {:>13.3f}'
         print 'Timings:'
@@ -72,6 +141,21 @@ class Timing(object):
                                                      timeTotal,
                                                      aveTotal)
 
+        peaks = self.get_peaks()
+        if peaks:
+            print 'Peak memory:'
+            for name, peak in peaks.iteritems():
+                print '\t{:<8} {:>10.1f}MB'.format(name, peak)
+            print
+
+        allocs = self.get_allocs()
+        if allocs:
+            print 'Allocations:'
+            for name, (count, size) in allocs.iteritems():
+                print '\t{:<8} {:>6d} {:>10.1f}MB'.format(name, count,
+                                                          size / 1024. ** 2)
+            print
+
 
 if __name__ == '__main__':
     print 'Please run harrier.py'
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+#
+#
+# Wild Find
+#
+#
+# Copyright 2014 - 2017 Al Brown
+#
+# Wildlife tracking and mapping
+#
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from wildfind.harrier.detect import CHANNEL_SPACE
+from wildfind.harrier.utils import Utils
+
+
+# Time an unseen collar is tracked for (s)
+TRACK_AGE = 60
+# Pulse width tolerance of a tracked collar (+/- %)
+TRACK_WIDTH_TOL = 25
+
+
+# A collar found in previous scans
+class Track(object):
+    def __init__(self, freq):
+        self.freq = freq
+        # Last detection, used as a template
+        self.collar = None
+        # Signal frequency relative to the baseband (Hz)
+        self.offset = None
+        self.seen = None
+        self.hits = 0
+
+    def update(self, collar, offset, timeStamp):
+        self.collar = collar
+        self.offset = offset
+        self.seen = timeStamp
+        self.hits += 1
+
+    # Pulse widths (samples) with TRACK_WIDTH_TOL tolerance
+    def get_widths(self, sampleRate):
+        width = self.collar.width * sampleRate / 1000.
+        return Utils.calc_tolerances([width], TRACK_WIDTH_TOL)
+
+    # Any pulse rate is accepted, the collar may have changed mode
+    def is_match(self, _pulse):
+        return True
+
+    # Pulse rate (PPM), width (ms) and modulation of the last detection
+    def get_template(self):
+        return self.collar.rate, self.collar.width, self.collar.mod
+
+
+# Tracks collars across scans so their signals can be searched first
+class Tracker(object):
+    def __init__(self):
+        self._tracks = {}
+
+        self._known = 0
+        self._hits = 0
+        self._skipped = 0
+        self._saved = 0.
+        # Average search time of a signal (s)
+        self._cost = None
+
+    # Tracks of the signals closest to each tracked channel, by signal number
+    def match(self, frequencies, baseband):
+        closest = {}
+        for signalNum, freq in enumerate(frequencies):
+            channel = freq + baseband
+            channel = int(round(channel / CHANNEL_SPACE) * CHANNEL_SPACE)
+            track = self._tracks.get(channel)
+            if track is None:
+                continue
+            distance = abs(freq - track.offset)
+            if channel not in closest or distance < closest[channel][0]:
+                closest[channel] = (distance, signalNum)
+
+        return dict((signalNum, self._tracks[channel])
+                    for channel, (_distance, signalNum)
+                    in closest.iteritems())
+
+    # Record a search, the time saved is estimated from the time taken to
+    # search the other signals
+    def record(self, known, hits, skipped, signals, elapsed):
+        self._known = known
+        self._hits = hits
+        self._skipped = skipped
+
+        if signals:
+            cost = elapsed / signals
+            if self._cost is None:
+                self._cost = cost
+            else:
+                self._cost = (self._cost + cost) / 2.
+        self._saved = skipped * self._cost if self._cost is not None else 0.
+
+    # Update tracks from the strongest collar in each channel and
+    # forget old tracks
+    def update(self, collars, frequencies, timeStamp):
+        strongest = {}
+        for collar in collars:
+            if collar.freq not in strongest or \
+                    collar.level > strongest[collar.freq].level:
+                strongest[collar.freq] = collar
+
+        for collar in strongest.itervalues():
+            track = self._tracks.get(collar.freq)
+            if track is None:
+                track = Track(collar.freq)
+                self._tracks[collar.freq] = track
+            track.update(collar, frequencies[collar.signalNum], timeStamp)
+
+        for freq, track in self._tracks.items():
+            if timeStamp - track.seen > TRACK_AGE:
+                del self._tracks[freq]
+
+    # Tracked collars searched, found & signals skipped in the last scan,
+    # and the estimated time saved (s)
+    def get_stats(self):
+        return self._known, self._hits, self._skipped, self._saved
+
+    def get_tracks(self):
+        return self._tracks.values()
+
+
+if __name__ == '__main__':
+    print 'Please run harrier.py'
+    exit(1)
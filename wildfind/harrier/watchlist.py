@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+#
+#
+# Wild Find
+#
+#
+# Copyright 2014 - 2017 Al Brown
+#
+# Wildlife tracking and mapping
+#
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from wildfind.harrier.collar import CW, MOD_DESC
+from wildfind.harrier.detect import PULSE_RATE_TOL
+from wildfind.harrier.utils import Utils
+
+
+# Pulse width tolerance of a watched collar (+/- %)
+WATCH_WIDTH_TOL = 25
+
+
+# A collar expected to be found
+class Watch(object):
+    def __init__(self, freq, rate, width, mod=CW):
+        # Frequency (Hz)
+        self.freq = freq
+        # Pulse rate (PPM)
+        self.rate = rate
+        # Pulse width (ms)
+        self.width = width
+        # Modulation type
+        self.mod = mod
+
+    # Pulse widths (samples) with WATCH_WIDTH_TOL tolerance
+    def get_widths(self, sampleRate):
+        width = self.width * sampleRate / 1000.
+        return Utils.calc_tolerances([width], WATCH_WIDTH_TOL)
+
+    # True if the pulse has the expected rate
+    def is_match(self, pulse):
+        tolerance = self.rate * PULSE_RATE_TOL / 100.
+        return abs(pulse.rate - self.rate) <= tolerance
+
+    # Pulse rate (PPM), width (ms) and modulation of the expected pulses
+    def get_template(self):
+        return self.rate, self.width, self.mod
+
+    def get_list(self):
+        return [self.freq / 1e6, self.rate, self.width, MOD_DESC[self.mod]]
+
+
+# Create a watch from a frequency (MHz), pulse rate (PPM), width (ms) &
+# optional modulation (CW / AM)
+def create_watch(freq, rate, width, mod='CW'):
+    freq = float(freq)
+    rate = float(rate)
+    width = float(width)
+    if freq <= 0 or rate <= 0 or width <= 0:
+        raise ValueError('Watch values must be positive')
+    mod = mod.strip().upper()
+    if mod not in MOD_DESC:
+        raise ValueError('Watch modulation must be one of: {}'.format(
+            ', '.join(MOD_DESC)))
+
+    return Watch(freq * 1e6, rate, width, MOD_DESC.index(mod))
+
+
+if __name__ == '__main__':
+    print 'Please run harrier.py'
+    exit(1)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+#
+#
+# Wild Find
+#
+#
+# Copyright 2014 - 2017 Al Brown
+#
+# Wildlife tracking and mapping
+#
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import numpy
+
+from wildfind.harrier.demod import DEMOD_BINS
+from wildfind.harrier.detect import bytes_to_complex
+from wildfind.harrier.workspace import WORKSPACE_DTYPE
+
+
+# Memory used by each sample of a window, the decoded samples and the
+# transform temporaries (bytes)
+WINDOW_SAMPLE_BYTES = 32
+# Candidate signals to reserve memory for
+WINDOW_CANDIDATES = 256
+
+
+# Largest window (samples) which keeps within memory (bytes), after the
+# memory reserved for the capture buffers and demodulated signals of
+# chunkSize samples per level, held as dtype
+# Less than DEMOD_BINS if the memory is too small
+def window_size(samples, memory, reserved, chunkSize=DEMOD_BINS,
+                dtype=WORKSPACE_DTYPE):
+    itemSize = numpy.dtype(dtype).itemsize
+    reserved += samples / chunkSize * WINDOW_CANDIDATES * itemSize
+
+    size = max(0, memory - reserved) / WINDOW_SAMPLE_BYTES
+    size -= size % DEMOD_BINS
+
+    return int(min(size, samples))
+
+
+# A capture of IQ bytes decoded a window at a time into a reused buffer,
+# optionally from a start sample
+class Windows(object):
+    def __init__(self, samples, window, start=0, iq=None):
+        self.size = samples - start
+        self._start = start
+        self._window = window
+        if iq is None:
+            iq = numpy.empty(window, dtype=numpy.complex64)
+        self._iq = iq
+        self._data = None
+
+    def get_window(self):
+        return self._window
+
+    def set_data(self, data):
+        self._data = data
+
+    # Windows of the samples from start, sharing the buffer
+    def get_tail(self, start):
+        tail = Windows(self._start + self.size, self._window,
+                       self._start + start, self._iq)
+        tail.set_data(self._data)
+        return tail
+
+    # Decoded samples of each window in turn
+    def __iter__(self):
+        stop = self._start + self.size
+        for start in range(self._start, stop, self._window):
+            end = min(start + self._window, stop)
+            iq = self._iq[:end - start]
+            bytes_to_complex(self._data[start * 2:end * 2], iq)
+            yield iq
+
+
+if __name__ == '__main__':
+    print 'Please run harrier.py'
+    exit(1)
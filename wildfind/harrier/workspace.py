@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+#
+#
+# Wild Find
+#
+#
+# Copyright 2014 - 2017 Al Brown
+#
+# Wildlife tracking and mapping
+#
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published by
+# the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import numpy
+
+
+# Default type of the buffers
+WORKSPACE_DTYPE = numpy.float32
+
+
+# Named buffers reused between scans, each grown only when too small
+# Allocations since the last reset are counted, and recorded by timing
+class Workspace(object):
+    def __init__(self, timing=None, dtype=WORKSPACE_DTYPE):
+        self._timing = timing
+        self._dtype = dtype
+        self._buffers = {}
+        self._allocs = 0
+        self._bytes = 0
+
+    def get_dtype(self):
+        return self._dtype
+
+    # Start counting the allocations of a new scan
+    def reset(self):
+        self._allocs = 0
+        self._bytes = 0
+
+    # Allocate a buffer ahead of the scans, not counted
+    def reserve(self, name, shape, dtype=None):
+        allocs = self._allocs
+        size = self._bytes
+        self.get(name, shape, dtype)
+        self._allocs = allocs
+        self._bytes = size
+
+    # Return an uninitialised array from the named buffer
+    def get(self, name, shape, dtype=None):
+        if dtype is None:
+            dtype = self._dtype
+        size = int(numpy.prod(shape)) * numpy.dtype(dtype).itemsize
+
+        buf = self._buffers.get(name)
+        if buf is None or buf.size < size:
+            buf = numpy.empty(size, dtype=numpy.uint8)
+            self._buffers[name] = buf
+            self._allocs += 1
+            self._bytes += size
+            if self._timing is not None:
+                self._timing.allocated(size)
+
+        return buf[:size].view(dtype).reshape(shape)
+
+    # Allocations and bytes allocated since the last reset
+    def get_stats(self):
+        return self._allocs, self._bytes
+
+    # Bytes held by all buffers
+    def get_size(self):
+        return sum(buf.size for buf in self._buffers.itervalues())
+
+
+if __name__ == '__main__':
+    print 'Please run harrier.py'
+    exit(1)